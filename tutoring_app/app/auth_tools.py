@@ -1,23 +1,64 @@
-from typing import List, Any
+from typing import Any, Tuple
+from collections import OrderedDict
+import hashlib
+import threading
+import time
 from fastapi import Depends, HTTPException
 from fastapi.security import OAuth2PasswordBearer
-from jose import JWTError, jwt
+from jose import ExpiredSignatureError, JWTError, jwt
 from logger import logger
 from database.database import UserRole
 from schemas.authentication_schema import DecodedAccessToken, DecodedRefreshToken
 from config import get_settings
-from datetime import datetime
-import requests
-import os
 
 # CONSTANTS
-GITLAB_API_URL = get_settings().gitlab_api_url
-SECRET_KEY = get_settings().secret_key
-ALGORITHM = get_settings().hash_algorithm
+settings = get_settings()
+GITLAB_API_URL = settings.gitlab_api_url
+SECRET_KEY = settings.secret_key
+ALGORITHM = settings.hash_algorithm
+ALGORITHMS = [ALGORITHM]  # Passed to jwt.decode, built once instead of per call
 
 # security scheme
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+# Verified token payloads, keyed by a hash of the token so the cache does not hold the credentials.
+# Clients send the same token with every request until it expires. The sync dependencies run
+# in the threadpool, every access to the cache holds the lock.
+DECODE_CACHE_SIZE = 10000
+_decoded_tokens: "OrderedDict[bytes, dict[str, Any]]" = OrderedDict()
+_decoded_tokens_lock = threading.Lock()
+
+def decode_token(token: str) -> dict[str, Any]:
+    """
+    Verify and decode a token. The payload is cached and reused until the token expires,
+    only tokens that passed verification are cached.
+    
+    Args:
+    - token (str): The token to decode
+    
+    Returns:
+    - dict: The token payload, a copy that the caller may modify
+    
+    Raises:
+    - ExpiredSignatureError: If the token has expired
+    - JWTError: If the token is invalid
+    """
+    key = hashlib.blake2b(token.encode(), digest_size=16).digest()
+    with _decoded_tokens_lock:
+        payload = _decoded_tokens.get(key)
+        if payload is not None:
+            if "exp" not in payload or payload["exp"] > time.time():
+                return dict(payload)
+            # Expired since it was cached, jwt.decode raises the expiration error below
+            del _decoded_tokens[key]
+
+    payload = jwt.decode(token, SECRET_KEY, algorithms=ALGORITHMS)
+    with _decoded_tokens_lock:
+        if key not in _decoded_tokens and len(_decoded_tokens) >= DECODE_CACHE_SIZE:
+            _decoded_tokens.popitem(last=False)  # Drop the oldest entry
+        _decoded_tokens[key] = payload
+    return dict(payload)
+
 ##################################
 ### AUTHORIZATION DEPENDENCIES ###
 ##################################
@@ -33,7 +74,7 @@ def get_current_user(token: str = Depends(oauth2_scheme)) -> DecodedAccessToken:
     - DecodedAccessToken: The user's data
     """
     try:
-        payload: dict[str, Any] = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload: dict[str, Any] = decode_token(token)
 
         if not payload.get("sub"):
             raise HTTPException(status_code=401, detail="Invalid token. Missing user ID.")
@@ -44,13 +85,12 @@ def get_current_user(token: str = Depends(oauth2_scheme)) -> DecodedAccessToken:
         if payload.get("logged_in") is False:
             raise HTTPException(status_code=401, detail="User is not logged in.")
 
-        # Check if token has expired
-        if payload.get("exp") < int(datetime.now().timestamp()):
-            raise HTTPException(status_code=401, detail="Token has expired.")
-        
         return DecodedAccessToken(**payload)
+    except ExpiredSignatureError:
+        # jwt.decode already checks the expiration time
+        raise HTTPException(status_code=401, detail="Token has expired.")
     except JWTError as e:
-        logger.error(f"Error decoding token: {str(e)}")
+        logger.error("Error decoding token: %s", e)
         raise HTTPException(status_code=401, detail="Invalid token. Could not decode token.")
 
 def get_refresh_token(token: str = Depends(oauth2_scheme)) -> DecodedRefreshToken:
@@ -64,7 +104,7 @@ def get_refresh_token(token: str = Depends(oauth2_scheme)) -> DecodedRefreshToke
     - DecodedRefreshToken: The refresh token data
     """
     try:
-        payload: dict[str, Any] = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload: dict[str, Any] = decode_token(token)
 
         if not payload.get("sub"):
             raise HTTPException(status_code=401, detail="Invalid token. Missing user ID.")
@@ -72,45 +112,54 @@ def get_refresh_token(token: str = Depends(oauth2_scheme)) -> DecodedRefreshToke
         if not payload.get("refresh"):
             raise HTTPException(status_code=401, detail="Invalid token. Access token provided.")
         
-        # Check if token has expired
-        if payload.get("exp") < int(datetime.now().timestamp()):
-            raise HTTPException(status_code=401, detail="Token has expired.")
-        
         return DecodedRefreshToken(**payload)
+    except ExpiredSignatureError:
+        # jwt.decode already checks the expiration time
+        raise HTTPException(status_code=401, detail="Token has expired.")
     except JWTError as e:
-        logger.error(f"Error decoding token: {str(e)}")
+        logger.error("Error decoding token: %s", e)
         raise HTTPException(status_code=401, detail="Invalid token. Could not decode token.")
 
-def verify_user_role(user: DecodedAccessToken, allowed_roles: List[UserRole]) -> DecodedAccessToken:
+def verify_user_role(user: DecodedAccessToken, allowed_roles: Tuple[str, ...]) -> DecodedAccessToken:
     """
     Verify that the user has the required role.
     
     Args:
     - user (DecodedAccessToken): The user's data
-    - allowed_roles (list): List of allowed roles
+    - allowed_roles (tuple): Values of the allowed roles, see role_values
     
     Returns:
     - DecodedAccessToken: The user's data
     """
-    if not user or user.role not in [role.value for role in allowed_roles]:
+    if not user or user.role not in allowed_roles:
         raise HTTPException(status_code=403,
-                            detail=f"User must have one of these roles: {[role.value for role in allowed_roles]}")
+                            detail=f"User must have one of these roles: {list(allowed_roles)}")
     
     return user
 
+def role_values(*roles: UserRole) -> Tuple[str, ...]:
+    """Values of the given roles, in order, as compared against the role in the token"""
+    return tuple(role.value for role in roles)
+
+# The allowed roles are constant, computed once instead of on every request
+STUDENT_ROLES = role_values(UserRole.STUDENT)
+TUTOR_ROLES = role_values(UserRole.TUTOR)
+ADMIN_ROLES = role_values(UserRole.ADMIN)
+
 def require_roles(*roles: UserRole) -> DecodedAccessToken:
+    allowed_roles = role_values(*roles)  # Once per dependency, not per request
     def dependency(current_user: DecodedAccessToken = Depends(get_current_user)) -> DecodedAccessToken:
-        return verify_user_role(current_user, roles)
+        return verify_user_role(current_user, allowed_roles)
     return dependency
 
 def student_only(current_user: DecodedAccessToken = Depends(get_current_user)) -> DecodedAccessToken:
     """Verify that the user is a student"""
-    return verify_user_role(current_user, [UserRole.STUDENT])
+    return verify_user_role(current_user, STUDENT_ROLES)
 
 def tutor_only(current_user: DecodedAccessToken = Depends(get_current_user)) -> DecodedAccessToken:
     """Verify that the user is a tutor """
-    return verify_user_role(current_user, [UserRole.TUTOR])
+    return verify_user_role(current_user, TUTOR_ROLES)
 
 def admin_only(current_user: DecodedAccessToken = Depends(get_current_user)) -> DecodedAccessToken:
     """Verify that the user is an admin """
-    return verify_user_role(current_user, [UserRole.ADMIN])
\ No newline at end of file
+    return verify_user_role(current_user, ADMIN_ROLES)
@@ -34,6 +34,8 @@ class Settings(BaseSettings):
     app_version: str = "0.1.0"
     app_host: str = "localhost"
     app_port: int = 8000
+    app_workers: int = 1 # Only use more than one worker with Redis, the in-memory refresh token store is per process
+    threadpool_size: int = 40 # Threads running the sync (database) endpoints concurrently, per worker
 
     # Local vs production settings
     local: bool = True # Default to local development
@@ -61,17 +63,23 @@ class Settings(BaseSettings):
     db_name: Optional[str] = None # Optional, required for cloud databases
     db_port: Optional[int] = None # Optional, required for cloud databases
     db_host: Optional[str] = None # Optional, required for cloud databases
+    db_pool_size: int = 10 # Connections kept open, per worker
+    db_max_overflow: int = 30 # Extra connections under load, pool size + overflow should cover threadpool_size
     
     # Redis settings
     use_redis: bool = False # Default to not using Redis, change this to True if you have a Redis server set up
     redis_host: str = "localhost"
     redis_port: int = 6379
     redis_password: Optional[str] = None
+    redis_max_connections: int = 32 # Connections shared by the request threads, per worker
 
     # Session settings
     session_expire_minutes: int = 60
     https_enabled: bool = True
 
+    # Host header settings
+    allowed_hosts: list[str] = ["*"] # e.g. ALLOWED_HOSTS='["yourdomain.example", "localhost"]' in production
+
     # Temporary admin account settings
     admin_name: str = "Admin"
     admin_email: str = "admin@example.com"
@@ -27,12 +27,11 @@ Usage:
         return User.get_by_id(db, user_id)
 """
 
-from sqlalchemy import create_engine, Column, Integer, String, Float, Text, DateTime, Boolean, ForeignKey, Enum, Index, CheckConstraint, Table
-from sqlalchemy.orm import relationship, declarative_base, sessionmaker
+from sqlalchemy import create_engine, event, select, bindparam, Column, Integer, String, Float, Text, DateTime, Boolean, ForeignKey, Enum, Index, CheckConstraint, Table
+from sqlalchemy.orm import relationship, backref, declarative_base, sessionmaker
 from sqlalchemy.engine.url import URL
 from datetime import datetime
 import uuid
-from passlib.context import CryptContext
 from config import get_settings
 import enum
 import re
@@ -103,6 +102,13 @@ def generate_uuid() -> str:
     """
     return str(uuid.uuid4()).lower()
 
+def insert_timestamp(context) -> datetime:
+    """
+    Default for updated_at, reuses the created_at value of the inserted row
+    instead of reading the clock again, so both start out identical.
+    """
+    return context.get_current_parameters().get("created_at") or datetime.now()
+
 # Subject Model for normalized subject storage
 class Subject(Base):
     """Represents academic subjects that can be taught/studied."""
@@ -116,13 +122,17 @@ class Subject(Base):
 # Junction table for student-subject relationship
 student_subjects = Table('student_subjects', Base.metadata,
     Column('student_profile_id', String(36), ForeignKey('student_profiles.id', ondelete='CASCADE'), primary_key=True),
-    Column('subject_id', String(36), ForeignKey('subjects.id', ondelete='CASCADE'), primary_key=True)
+    Column('subject_id', String(36), ForeignKey('subjects.id', ondelete='CASCADE'), primary_key=True),
+    # The primary key only covers lookups by profile, this one covers the students of a subject
+    Index('idx_student_subjects_subject', 'subject_id', 'student_profile_id')
 )
 
 # Junction table for tutor-expertise relationship
 tutor_expertise = Table('tutor_expertise', Base.metadata,
     Column('tutor_profile_id', String(36), ForeignKey('tutor_profiles.id', ondelete='CASCADE'), primary_key=True),
-    Column('subject_id', String(36), ForeignKey('subjects.id', ondelete='CASCADE'), primary_key=True)
+    Column('subject_id', String(36), ForeignKey('subjects.id', ondelete='CASCADE'), primary_key=True),
+    # The primary key only covers lookups by profile, this one covers the tutors of a subject
+    Index('idx_tutor_expertise_subject', 'subject_id', 'tutor_profile_id')
 )
 
 # User Model
@@ -156,13 +166,13 @@ class User(Base):
     #password = Column(String(255), nullable=False)  # Store hashed passwords
     name = Column(String(100), nullable=False)  # Added length constraint
     created_at = Column(DateTime, default=datetime.now, nullable=False)
-    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now, nullable=False)
+    updated_at = Column(DateTime, default=insert_timestamp, onupdate=datetime.now, nullable=False)
     is_banned_until = Column(DateTime, nullable=True)  # Nullable field for ban duration
     #reports = relationship("UserReport", back_populates="user")
 
     # Relationships
-    student_profile = relationship("StudentProfile", back_populates="user", uselist=False)
-    tutor_profile = relationship("TutorProfile", back_populates="user", uselist=False)
+    student_profile = relationship("StudentProfile", back_populates="user", uselist=False, cascade='all, delete-orphan')
+    tutor_profile = relationship("TutorProfile", back_populates="user", uselist=False, cascade='all, delete-orphan')
     chats_as_student = relationship(
         "Chat",
         primaryjoin="User.id==Chat.student_id",
@@ -190,6 +200,11 @@ class User(Base):
         if not is_valid_uuid(user_id):
             return None
         return db.query(cls).filter(cls.id == user_id).first()
+
+    @classmethod
+    def get_by_email(cls, db, email: str) -> Optional['User']:
+        """Get user by email, with the prebuilt USER_BY_EMAIL statement."""
+        return db.execute(USER_BY_EMAIL, {"email": email}).scalar_one_or_none()
     
     @property
     def uuid(self) -> str:
@@ -222,7 +237,7 @@ class StudentProfile(Base):
     subjects = relationship("Subject", secondary=student_subjects, backref="students")
 
     # Relationships
-    user = relationship("User", back_populates="student_profile", lazy='joined')
+    user = relationship("User", back_populates="student_profile")
 
     @property
     def uuid(self) -> str:
@@ -254,7 +269,7 @@ class TutorProfile(Base):
     expertise = relationship("Subject", secondary=tutor_expertise, backref="tutors")
 
     # Relationships
-    user = relationship("User", back_populates="tutor_profile", lazy='joined')
+    user = relationship("User", back_populates="tutor_profile")
 
     @property
     def uuid(self) -> str:
@@ -262,7 +277,8 @@ class TutorProfile(Base):
 
     def __repr__(self):
         """String representation of the TutorProfile object."""
-        return f"<TutorProfile(id={self.id}, user_id={self.user_id}, expertise={self.expertise})>"
+        # Only column attributes, formatting the expertise relationship would lazy load it with a query
+        return f"<TutorProfile(id={self.id}, user_id={self.user_id}, rating={self.rating})>"
 
 # Chat Model
 class Chat(Base):
@@ -271,20 +287,18 @@ class Chat(Base):
     student_id = Column(String(36), ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
     tutor_id = Column(String(36), ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
     created_at = Column(DateTime, default=datetime.now, nullable=False)
-    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now, nullable=False)
+    updated_at = Column(DateTime, default=insert_timestamp, onupdate=datetime.now, nullable=False)
 
     # Relationships
     student = relationship(
         "User",
         back_populates="chats_as_student",
-        foreign_keys=[student_id],
-        lazy='joined'
+        foreign_keys=[student_id]
     )
     tutor = relationship(
         "User",
         back_populates="chats_as_tutor",
-        foreign_keys=[tutor_id],
-        lazy='joined'
+        foreign_keys=[tutor_id]
     )
     messages = relationship(
         "Message",
@@ -312,8 +326,7 @@ class Message(Base):
     sender = relationship(
         "User",
         back_populates="messages_sent",
-        foreign_keys=[sender_id],
-        lazy='joined'
+        foreign_keys=[sender_id]
     )
 
     def __repr__(self):
@@ -333,8 +346,8 @@ class Appointment(Base):
     created_by = Column(String(36), ForeignKey('users.id'), nullable=False) # User who created the appointment
 
     # Relationships
-    student = relationship("User", foreign_keys=[student_id], lazy='joined')
-    tutor = relationship("User", foreign_keys=[tutor_id], lazy='joined')
+    student = relationship("User", foreign_keys=[student_id])
+    tutor = relationship("User", foreign_keys=[tutor_id])
 
     def __repr__(self):
         """String representation of the Appointment object."""
@@ -349,7 +362,7 @@ class MessageReport(Base):
     created_at = Column(DateTime, default=datetime.now, nullable=False)
 
     # Relationships
-    message = relationship("Message", backref="reports", foreign_keys=[message_id])
+    message = relationship("Message", backref=backref("reports", cascade='all, delete-orphan'), foreign_keys=[message_id])
 
     def __repr__(self):
         """String representation of the MessageReport object."""
@@ -364,18 +377,34 @@ class UserReport(Base):
     created_at = Column(DateTime, default=datetime.now, nullable=False)
 
     # Relationships
-    user = relationship("User", backref="reports", foreign_keys=[user_id])
+    user = relationship("User", backref=backref("reports", cascade='all, delete-orphan'), foreign_keys=[user_id])
     reported_by = relationship("User", foreign_keys=[by])
 
     def __repr__(self):
         """String representation of the UserReport object."""
         return f"<UserReport(id={self.id}, user_id={self.user_id}, reason={self.reason})>"
 
+# Prebuilt statements for hot queries, compiled once and then served from the compiled cache
+USER_BY_EMAIL = select(User).where(User.email == bindparam("email"))
+
 # Add indexes for frequently queried columns
 Index('idx_user_email_role', User.email, User.role)
 Index('idx_tutor_rating', TutorProfile.rating)
 Index('idx_appointment_date', Appointment.date)
 Index('idx_message_timestamp', Message.timestamp)
+Index('idx_message_chat_timestamp', Message.chat_id, Message.timestamp)
+# Partial index, deleted (reported) messages are a small minority of all messages.
+# Keyed by (timestamp, id) so the reports can be listed and paginated in order straight from the index.
+Index('idx_message_deleted_timestamp_id', Message.timestamp, Message.id,
+      sqlite_where=Message.is_deleted == True, postgresql_where=Message.is_deleted == True)
+Index('idx_chat_student', Chat.student_id)
+Index('idx_chat_tutor', Chat.tutor_id)
+Index('idx_appointment_tutor_date', Appointment.tutor_id, Appointment.date)
+Index('idx_appointment_student_date', Appointment.student_id, Appointment.date)
+# Foreign keys the delete_user cascade loads by, with SELECT ... WHERE <fk> IN (...)
+Index('idx_message_sender', Message.sender_id)
+Index('idx_message_report_message', MessageReport.message_id)
+Index('idx_user_report_user', UserReport.user_id)
 
 # Database setup
 DATABASE_URL = get_settings().db_url
@@ -394,12 +423,42 @@ if not get_settings().local:
 engine = create_engine(
     DATABASE_URL, 
     echo=False,
-    pool_size=5,
-    max_overflow=10,
-    pool_timeout=30
+    # Every threadpool thread running a database endpoint can hold a connection,
+    # sized so that requests do not wait for a connection at full concurrency
+    pool_size=get_settings().db_pool_size,
+    max_overflow=get_settings().db_max_overflow,
+    pool_timeout=30,
+    query_cache_size=1200, # Compiled statement cache, default is 500
+    # Cloud SQL drops idle connections, recycle them before that happens
+    # and check them on checkout instead of failing the request
+    pool_pre_ping=not get_settings().local,
+    pool_recycle=1800 if not get_settings().local else -1
 )
 
+if engine.dialect.name == "sqlite":
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        """
+        Tune every new SQLite connection once, pooled connections keep these settings.
+        WAL lets readers run alongside a writer and only needs a sync at checkpoints,
+        the larger page cache and memory-mapped reads keep hot pages in memory.
+        """
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute("PRAGMA mmap_size=268435456")  # 256 MB
+        cursor.execute("PRAGMA cache_size=-65536")  # 64 MB
+        cursor.close()
+
 Base.metadata.create_all(engine)
+
+# create_all skips tables that already exist, including their indexes,
+# so indexes added later are created on existing databases here
+for table in Base.metadata.sorted_tables:
+    for index in table.indexes:
+        index.create(engine, checkfirst=True)
+
 SessionLocal = sessionmaker(bind=engine)
 
 # Dependency to get DB session
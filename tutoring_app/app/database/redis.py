@@ -1,5 +1,6 @@
 from config import get_settings
 import redis
+from redis import asyncio as aioredis
 import os
 
 class RedisClient:
@@ -13,7 +14,8 @@ class RedisClient:
         redis_host (str): Redis server hostname/IP
         redis_port (int): Redis server port
         redis_password (str): Redis server password
-        client (redis.StrictRedis): Redis client instance
+        client (redis.Redis): Redis client instance, backed by a bounded connection pool
+        async_client (redis.asyncio.Redis): Redis client for async code (the session middleware), with its own bounded pool
     """
 
     def __init__(self):
@@ -35,12 +37,26 @@ class RedisClient:
         #                    strings (True) or not (False). We set this to True
         #                    so that we don't have to manually decode all the
         #                    responses.
-        self.client = redis.StrictRedis(
+        # The connections are shared by all request threads. The pool is bounded,
+        # when all connections are in use a request waits for one to be released
+        # instead of opening a new connection.
+        self.client = redis.Redis(connection_pool=redis.BlockingConnectionPool(
             host=self.redis_host,
             port=self.redis_port,
             password=self.redis_password,
+            max_connections=get_settings().redis_max_connections,
             decode_responses=True
-        )
+        ))
+
+        # Async connections can not be shared with the sync client, the async client
+        # gets its own pool with the same limit. Responses are returned as bytes.
+        # No connection is opened until the client is first used.
+        self.async_client = aioredis.Redis(connection_pool=aioredis.BlockingConnectionPool(
+            host=self.redis_host,
+            port=self.redis_port,
+            password=self.redis_password,
+            max_connections=get_settings().redis_max_connections
+        ))
 
     def set_refresh_token(self, token: str, token_id: str, expiration: int):
         """
@@ -97,14 +113,72 @@ class RedisClient:
         """
         return self.client.get(key)
 
-    def delete_cache(self, key: str):
+    def delete_cache(self, *keys: str):
+        """
+        Delete one or more cached values, in a single round-trip.
+
+        Args:
+            keys (str): Cache keys to delete
+        """
+        self.client.delete(*keys)
+
+    def get_cache_version(self, key: str) -> int:
+        """
+        Get the version of a versioned cache entry, see invalidate_cache.
+
+        Args:
+            key (str): Cache key
+
+        Returns:
+            int: The number of times the entry has been invalidated recently, 0 if never
+        """
+        return int(self.client.get(f"{key}:version") or 0)
+
+    def invalidate_cache(self, key: str):
         """
-        Delete a cached value.
+        Bump the version of a cached value and delete it, atomically in a single round-trip.
+        Writers that built the value from data read before the invalidation
+        are rejected by set_cache_if_version.
 
         Args:
-            key (str): Cache key to delete
+            key (str): Cache key to invalidate
+        """
+        version_key = f"{key}:version"
+        # MULTI/EXEC, no other command runs between the commands. The version is bumped
+        # before the delete, a writer that still sees the old version can not cache after it.
+        with self.client.pipeline(transaction=True) as pipe:
+            pipe.incr(version_key)
+            pipe.expire(version_key, 3600)  # Longer than any pending write
+            pipe.delete(key)
+            pipe.execute()
+
+    def set_cache_if_version(self, key: str, value: str, expiration: int, version: int) -> bool:
+        """
+        Set a cached value, unless the entry has been invalidated since `version` was read.
+        The check and the write are atomic (WATCH/MULTI).
+
+        Args:
+            key (str): Cache key
+            value (str): Value to cache
+            expiration (int): Time in seconds until the cache expires
+            version (int): Version read with get_cache_version before the value was built
+
+        Returns:
+            bool: Whether the value was cached
         """
-        self.client.delete(key)
+        version_key = f"{key}:version"
+        with self.client.pipeline() as pipe:
+            try:
+                pipe.watch(version_key)
+                if int(pipe.get(version_key) or 0) != version:
+                    return False
+                pipe.multi()
+                pipe.setex(key, expiration, value)
+                pipe.execute()
+                return True
+            except redis.WatchError:
+                # Invalidated between the check and the write
+                return False
 
 # Global Redis client instance
-redis_client = RedisClient()
\ No newline at end of file
+redis_client = RedisClient()
@@ -1,6 +1,9 @@
 import logging
 import sys
 import json
+import atexit
+import queue
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from config import get_settings
 from datetime import datetime
 from pathlib import Path
@@ -26,16 +29,24 @@ def setup_logger(name: str = "server"):
     console_handler.setFormatter(console_formatter)
     console_handler.setLevel(logging.INFO)
 
-    # Create file handler
-    file_handler = logging.FileHandler(
-        f"{get_settings().logs_dir}/server_{datetime.now().strftime('%Y%m%d')}.log"
+    # Create file handler, rotated at 10 MB with 5 backups
+    file_handler = RotatingFileHandler(
+        f"{get_settings().logs_dir}/server_{datetime.now().strftime('%Y%m%d')}.log",
+        maxBytes=10 * 1024 * 1024,
+        backupCount=5
     )
     file_handler.setFormatter(file_formatter)
     file_handler.setLevel(logging.INFO)
 
+    # The logger only puts records on a queue, a background thread writes them
+    # to the handlers so logging calls do not block requests on I/O
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, console_handler, file_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop) # Flush the remaining records on exit
+
     # Add handlers to logger
-    logger.addHandler(console_handler)
-    logger.addHandler(file_handler)
+    logger.addHandler(QueueHandler(log_queue))
 
     return logger
 
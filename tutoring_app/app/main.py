@@ -1,51 +1,73 @@
 from fastapi import FastAPI, Request
+from fastapi.responses import ORJSONResponse, Response
 from functools import lru_cache
-from datetime import datetime
-import os, sys
-from dotenv import load_dotenv
+import os, sys, time
+import gzip
+import logging
+import orjson
+import anyio
 from logger import logger
-from starlette.middleware.sessions import SessionMiddleware
-from starlette.middleware.base import BaseHTTPMiddleware
+from sessions import RedisSessionMiddleware, EncryptedSessionMiddleware
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.middleware.trustedhost import TrustedHostMiddleware
 from mock_data import mock_users, mock_chats, mock_messages, mock_appointments, mock_reports, mock_tutors
 from config import get_settings
 
 ### ROUTERS
 from routers.admin import router as admin_router
 from routers.appointment import router as appointment_router
-from routers.authentication import router as auth_router
+from routers.authentication import router as auth_router, load_gitlab_metadata, close_gitlab_connections
 from routers.chat import router as chat_router
 from routers.report import router as report_router
 from routers.support import router as support_router
 from routers.user  import router as user_router
 
 
-class LoggingMiddleware(BaseHTTPMiddleware):
+class LoggingMiddleware:
     """
     Middleware for logging all HTTP requests and responses.
     
-    Logs request method, URL, response status, and timing information.
+    Logs request method, path, response status, and timing information.
     Handles errors by logging exceptions.
+
+    Plain ASGI middleware, unlike BaseHTTPMiddleware it does not wrap each
+    request in a new task and response stream. When INFO is disabled the
+    requests are passed through without any work.
     """
-    async def dispatch(self, request: Request, call_next):
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not logger.isEnabledFor(logging.INFO):
+            await self.app(scope, receive, send)
+            return
+
         # Log request
-        start_time = datetime.now()
-        logger.info(f"Request: {request.method} {request.url}")
-        
+        start_time = time.perf_counter_ns()
+        logger.info("Request: %s %s", scope["method"], scope["path"])
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                # Log response
+                duration = (time.perf_counter_ns() - start_time) / 1_000_000_000
+                logger.info("Response: %s - Duration: %.3fs", message["status"], duration)
+            await send(message)
+
         try:
-            response = await call_next(request)
-            # Log response
-            duration = (datetime.now() - start_time).total_seconds()
-            logger.info(f"Response: {response.status_code} - Duration: {duration:.3f}s")
-            return response
+            await self.app(scope, receive, send_wrapper)
         except Exception as e:
             # Log error
-            logger.error(f"Error processing request: {str(e)}")
+            logger.error("Error processing request: %s", e)
             raise
 
+settings = get_settings()
+
 app = FastAPI(
-    title=get_settings().app_name,
-    version=get_settings().app_version,
+    title=settings.app_name,
+    version=settings.app_version,
+    default_response_class=ORJSONResponse,
     openapi_url="/openapi.json",
     docs_url="/docs",
     redoc_url="/redoc"
@@ -55,13 +77,23 @@ app = FastAPI(
 app.add_middleware(LoggingMiddleware)
 
 # More secure session configuration with environment variables
-app.add_middleware(
-    SessionMiddleware,
-    secret_key=get_settings().secret_key,
-    max_age=get_settings().session_expire_minutes * 60,  # Convert minutes to seconds
-    same_site="lax",
-    https_only=get_settings().https_enabled
-)
+if settings.use_redis:
+    # Keep session data server-side, the cookie only holds the session ID
+    app.add_middleware(
+        RedisSessionMiddleware,
+        max_age=settings.session_expire_minutes * 60,  # Convert minutes to seconds
+        same_site="lax",
+        https_only=settings.https_enabled
+    )
+else:
+    # Session data is kept in an encrypted cookie
+    app.add_middleware(
+        EncryptedSessionMiddleware,
+        secret_key=settings.secret_key,
+        max_age=settings.session_expire_minutes * 60,  # Convert minutes to seconds
+        same_site="lax",
+        https_only=settings.https_enabled
+    )
 
 # Add CORS middleware with environment configuration
 app.add_middleware(
@@ -74,6 +106,14 @@ app.add_middleware(
     max_age=3600
 )
 
+# Compress larger responses. Level 6 compresses JSON nearly as well as the default 9 for much less CPU.
+app.add_middleware(GZipMiddleware, minimum_size=500, compresslevel=6)
+
+# Added last so it is the outermost middleware, requests with an unknown
+# Host header are rejected before the session cookie is decrypted
+if settings.allowed_hosts != ["*"]:
+    app.add_middleware(TrustedHostMiddleware, allowed_hosts=settings.allowed_hosts)
+
 # Include routers
 app.include_router(admin_router, tags=['admin'])
 app.include_router(appointment_router, tags=['appointments'])
@@ -83,45 +123,103 @@ app.include_router(report_router, tags=['report'])
 app.include_router(support_router, tags=['support'])
 app.include_router(user_router, tags=['users'])
 
-@app.get("/")
-def read_root():
+# Constant response bodies are serialized once
+ROOT_RESPONSE = orjson.dumps({"message": "Welcome to the Tutoring API!!!"})
+
+@app.get("/", response_model=None)
+async def read_root() -> Response:
     """
     Root endpoint returning API welcome message.
 
     Returns:
     - dict: Welcome message
     """
-    return {"message": "Welcome to the Tutoring API!!!"}
-
-@app.get("/mock/users")
-def get_mock_users():
+    return Response(content=ROOT_RESPONSE, media_type="application/json")
+
+# The mock data never changes while the server runs, serialize it once.
+# The handlers are async, returning a constant does not need a threadpool thread.
+MOCK_RESPONSES = {
+    name: orjson.dumps({name: data})
+    for name, data in [("users", mock_users), ("chats", mock_chats), ("messages", mock_messages),
+                       ("appointments", mock_appointments), ("reports", mock_reports), ("tutors", mock_tutors)]
+}
+# Compressed once as well, at the highest level, kept where it is smaller.
+# GZipMiddleware leaves responses with a Content-Encoding as they are.
+def compress_mock_responses(responses: dict) -> dict:
+    """Gzip each body, keeping only the ones the compression makes smaller"""
+    compressed_responses = {}
+    for name, body in responses.items():
+        compressed = gzip.compress(body, compresslevel=9, mtime=0)
+        if len(compressed) < len(body):
+            compressed_responses[name] = compressed
+    return compressed_responses
+
+MOCK_RESPONSES_GZIP = compress_mock_responses(MOCK_RESPONSES)
+
+def accepts_gzip(accept_encoding: str) -> bool:
+    """
+    Whether an Accept-Encoding header allows a gzip response.
+    The header is parsed into codings and q-values: "gzip;q=0" refuses gzip,
+    unknown codings that merely contain "gzip" do not count, and "*" covers gzip
+    when gzip is not listed itself.
+    """
+    wildcard = False
+    for item in accept_encoding.split(","):
+        coding, _, params = item.partition(";")
+        coding = coding.strip().lower()
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0  # Malformed q-value, do not assume the coding is accepted
+        if coding in ("gzip", "x-gzip"):
+            return q > 0
+        if coding == "*":
+            wildcard = q > 0
+    return wildcard
+
+def mock_response(request: Request, name: str) -> Response:
+    """Return the precomputed mock response, gzip compressed if the client accepts it"""
+    if name not in MOCK_RESPONSES_GZIP:
+        return Response(content=MOCK_RESPONSES[name], media_type="application/json")
+    if accepts_gzip(request.headers.get("Accept-Encoding", "")):
+        return Response(content=MOCK_RESPONSES_GZIP[name], media_type="application/json",
+                        headers={"Content-Encoding": "gzip", "Vary": "Accept-Encoding"})
+    return Response(content=MOCK_RESPONSES[name], media_type="application/json",
+                    headers={"Vary": "Accept-Encoding"})
+
+@app.get("/mock/users", response_model=None)
+async def get_mock_users(request: Request) -> Response:
     """
     Get mock user data for testing.
     
     Returns:
     - dict: List of mock users
     """
-    return {"users": mock_users}
+    return mock_response(request, "users")
 
-@app.get("/mock/chats")
-def get_mock_chats():
-    return {"chats": mock_chats}
+@app.get("/mock/chats", response_model=None)
+async def get_mock_chats(request: Request) -> Response:
+    return mock_response(request, "chats")
 
-@app.get("/mock/messages")
-def get_mock_messages():
-    return {"messages": mock_messages}
+@app.get("/mock/messages", response_model=None)
+async def get_mock_messages(request: Request) -> Response:
+    return mock_response(request, "messages")
 
-@app.get("/mock/appointments")
-def get_mock_appointments():
-    return {"appointments": mock_appointments}
+@app.get("/mock/appointments", response_model=None)
+async def get_mock_appointments(request: Request) -> Response:
+    return mock_response(request, "appointments")
 
-@app.get("/mock/reports")
-def get_mock_reports():
-    return {"reports": mock_reports}
+@app.get("/mock/reports", response_model=None)
+async def get_mock_reports(request: Request) -> Response:
+    return mock_response(request, "reports")
 
-@app.get("/mock/tutors")
-def get_mock_tutors():
-    return {"tutors": mock_tutors}
+@app.get("/mock/tutors", response_model=None)
+async def get_mock_tutors(request: Request) -> Response:
+    return mock_response(request, "tutors")
 
 @app.on_event("startup")
 async def startup_event():
@@ -130,11 +228,18 @@ async def startup_event():
     Initializes services and logs startup.
     """
     logger.info("Server starting up...")
+    # Sync endpoints run in anyio's threadpool, its size caps how many database requests run at once
+    anyio.to_thread.current_default_thread_limiter().total_tokens = settings.threadpool_size
+    await load_gitlab_metadata()
 
 @app.on_event("shutdown")
 async def shutdown_event():
     logger.info("Server shutting down...")
+    await close_gitlab_connections()
 
 if __name__ == '__main__':
     import uvicorn
-    uvicorn.run(app, host=get_settings().app_host, port=get_settings().app_port)
\ No newline at end of file
+    # uvloop and httptools are picked automatically when installed (not available on Windows).
+    # Requests are already logged by LoggingMiddleware, so uvicorn's access log is disabled.
+    uvicorn.run("main:app", host=settings.app_host, port=settings.app_port, workers=settings.app_workers,
+                loop="auto", http="auto", access_log=False)
\ No newline at end of file
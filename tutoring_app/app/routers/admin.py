@@ -2,39 +2,48 @@
 Admin router providing administrative endpoints for managing users, chats, reports and dashboard.
 Requires admin authentication for all endpoints.
 """
-from fastapi import APIRouter, Depends, HTTPException, Request  # Add Request import
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request  # Add Request import
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
+from sqlalchemy import select, func, insert, update, exists, tuple_
+from sqlalchemy.orm import Session, joinedload, selectinload
 from datetime import datetime
-from typing import List
+from typing import List, Optional
 from routers.authentication import limiter
 from auth_tools import admin_only
-from database.database import get_db, User, Chat, Message, Appointment
-from utilities import get_user_by_id, get_chat_with_messages
+from database.database import get_db, generate_uuid, SessionLocal, User, Chat, Message, Appointment
+from utilities import get_user_by_id, get_chat_with_messages, chat_to_dict, report_to_dict, user_to_dict
 from schemas.admin_schema import AdminDashboardResponse
-from schemas.chat_schema import ChatResponse, MessageDeletedReponse, MessageSentResponse, MessageResponse, BanUserReponse
-from schemas.user_schema import UserCreate, UserResponse
-import logging
+from schemas.chat_schema import (ChatResponse, MessageDeletedReponse, MessageSentResponse, MessageResponse, BanUserReponse,
+                                 BulkDeleteMessages, BulkMessagesDeletedResponse, BulkBanUsers, BulkBanUsersResponse)
+from schemas.user_schema import UserCreate, UserCreatedResponse, UserResponse
+from schemas.authentication_schema import DecodedAccessToken
 from database.redis import redis_client
-import json
+from logger import logger
+import orjson
 from config import get_settings  # Add the missing import for get_settings
 
 #hi
 router = APIRouter(prefix='/admin')
 USE_REDIS = get_settings().use_redis
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
-
 MAX_ADMINS = 7  # Add this constant at the top after imports
+REPORTS_PAGE_SIZE = 50
+MAX_REPORTS_PAGE_SIZE = 200
+
+# All dashboard counts in a single statement: SELECT (SELECT count(*) FROM users), (SELECT count(*) FROM chats), ...
+DASHBOARD_COUNTS = select(
+    select(func.count()).select_from(User).scalar_subquery(),
+    select(func.count()).select_from(Chat).scalar_subquery(),
+    select(func.count()).select_from(Appointment).scalar_subquery()
+)
 
-@router.get('/dashboard', response_model=AdminDashboardResponse)
+@router.get('/dashboard', response_model=None, responses={200: {"model": AdminDashboardResponse}})
 @limiter.limit("10/minute")
-async def admin_dashboard(
+def admin_dashboard(
     request: Request,
     db: Session = Depends(get_db),
     _=Depends(admin_only)
-):
+) -> Response:
     """
     Fetch admin dashboard data including user count, chat count and appointment count.
     Rate limited to 10 requests per minute.
@@ -46,26 +55,23 @@ async def admin_dashboard(
         cache_key = "admin_dashboard_data"
         cached_data = redis_client.get_cache(cache_key)
         if cached_data:
-            print('Returning cached data')
-            return json.loads(cached_data)
+            return Response(content=cached_data, media_type="application/json")
 
-    # Fetch admin dashboard data
-    user_count = db.query(User).count()
-    chat_count = db.query(Chat).count()
-    appointment_count = db.query(Appointment).count()
+    # Fetch admin dashboard data in one round trip
+    user_count, chat_count, appointment_count = db.execute(DASHBOARD_COUNTS).one()
 
-    data = {
+    data = orjson.dumps({
         "user_count": user_count,
         "chat_count": chat_count,
         "appointment_count": appointment_count
-    }
+    })
     if USE_REDIS:
-        redis_client.set_cache(cache_key, json.dumps(data, default=str), expiration=600)  # Cache for 10 minutes
+        redis_client.set_cache(cache_key, data, expiration=600)  # Cache for 10 minutes
     
-    return data
+    return Response(content=data, media_type="application/json")
 
-@router.get('/chats/{chatID}/messages', response_model=ChatResponse)
-def get_chat_messages(request: Request, chatID: str, db: Session = Depends(get_db), _=Depends(admin_only)):  
+@router.get('/chats/{chatID}/messages', response_model=None, responses={200: {"model": ChatResponse}})
+def get_chat_messages(request: Request, chatID: str, db: Session = Depends(get_db), _=Depends(admin_only)) -> ORJSONResponse:
     """
     Fetches messages for a specific chat.
 
@@ -76,9 +82,9 @@ def get_chat_messages(request: Request, chatID: str, db: Session = Depends(get_d
         _ (Depends): Dependency to ensure the user is an admin.
 
     Returns:
-        ChatResponse: The response model containing chat messages.
+        ORJSONResponse: The chat with its messages, in the shape of ChatResponse.
     """
-    return get_chat_with_messages(db, chatID)
+    return ORJSONResponse(chat_to_dict(get_chat_with_messages(db, chatID)))
 
 @router.delete('/chats/delete/{messageID}', response_model=MessageDeletedReponse)
 def delete_chat_message(request: Request, messageID: str, db: Session = Depends(get_db), _=Depends(admin_only)):  # Changed from int
@@ -97,16 +103,47 @@ def delete_chat_message(request: Request, messageID: str, db: Session = Depends(
     Returns:
         dict: A dictionary containing the message ID and a confirmation message.
     """
-    # Delete a specific message in a chat
-    message = db.query(Message).filter(Message.id == messageID).first()
-    if not message:
+    # Delete a specific message in a chat, with a single UPDATE instead of loading the message first.
+    # No matched row means the message does not exist.
+    result = db.execute(update(Message).where(Message.id == messageID).values(is_deleted=True))
+    if result.rowcount == 0:
         raise HTTPException(status_code=404, detail="Message not found")
-    message.is_deleted = True
     db.commit()
     return {"message_id" : messageID, "message": f"Message {messageID} deleted"}
 
+@router.post('/chats/{chatID}/messages/bulk_delete', response_model=BulkMessagesDeletedResponse)
+def bulk_delete_chat_messages(request: Request, chatID: str, body: BulkDeleteMessages, db: Session = Depends(get_db), _=Depends(admin_only)):
+    """
+    Delete several messages of a chat at once.
+
+    Args:
+        request (Request): The request object.
+        chatID (str): The ID of the chat the messages belong to.
+        body (BulkDeleteMessages): The IDs of the messages to be deleted.
+        db (Session, optional): The database session. Defaults to Depends(get_db).
+        _ (Depends, optional): Dependency to ensure the user is an admin. Defaults to Depends(admin_only).
+
+    Raises:
+        HTTPException: If the chat is not found (404).
+
+    Returns:
+        dict: A dictionary containing the chat ID, the number of deleted messages and a confirmation message.
+    """
+    # A single UPDATE ... WHERE id IN (...) instead of loading and updating each message.
+    # Messages of other chats, unknown IDs and messages that are already deleted are not matched and not counted.
+    result = db.execute(
+        update(Message)
+        .where(Message.chat_id == chatID, Message.id.in_(body.message_ids), Message.is_deleted == False)
+        .values(is_deleted=True)
+    )
+    # Only check that the chat exists when nothing was deleted, a match already proves it
+    if result.rowcount == 0 and not db.query(exists().where(Chat.id == chatID)).scalar():
+        raise HTTPException(status_code=404, detail="Chat not found")
+    db.commit()
+    return {"chat_id": chatID, "deleted_count": result.rowcount, "message": f"{result.rowcount} messages deleted in chat {chatID}"}
+
 @router.post('/chats/{chatID}/messages', response_model=MessageSentResponse)
-def send_chat_message(request: Request, chatID: str, content: str, db: Session = Depends(get_db), _=Depends(admin_only)):  # Changed from int
+def send_chat_message(request: Request, chatID: str, content: str, db: Session = Depends(get_db), admin: DecodedAccessToken = Depends(admin_only)):  # Changed from int
     """
     Sends a message to a specific chat.
 
@@ -115,81 +152,167 @@ def send_chat_message(request: Request, chatID: str, content: str, db: Session =
         chatID (str): The ID of the chat to which the message will be sent.
         content (str): The content of the message to be sent.
         db (Session, optional): The database session dependency. Defaults to Depends(get_db).
-        _ (Depends, optional): The admin-only dependency. Defaults to Depends(admin_only).
+        admin (DecodedAccessToken, optional): The admin sending the message. Defaults to Depends(admin_only).
 
     Returns:
         dict: A dictionary containing the message ID, chat ID, and a confirmation message.
     """
-    # Send a message to a specific chat
-    message = Message(
+    # Send a message to a specific chat, as a plain INSERT without loading the message back.
+    # The ID is generated here, so it does not have to be read back from the database.
+    message_id = generate_uuid()
+    db.execute(insert(Message).values(
+        id=message_id,
         chat_id=chatID,
-        sender_id=1,  # Assuming admin ID is 1
-        content=content,
-        timestamp=datetime.now()
-    )
-    db.add(message)
+        sender_id=admin.sub,
+        content=content
+    ))
     db.commit()
-    db.refresh(message)
-    return {"message_id": message.id, "chat_id": chatID, "message": f"Message sent to chat {chatID}"}
+    return {"message_id": message_id, "chat_id": chatID, "message": f"Message sent to chat {chatID}"}
 
 @router.get('/reports')
 @limiter.limit("10/minute")  # Add rate limiting
-def get_reports(request: Request, db: Session = Depends(get_db), _=Depends(admin_only)):
+def get_reports(
+    request: Request,
+    limit: int = Query(REPORTS_PAGE_SIZE, ge=1, le=MAX_REPORTS_PAGE_SIZE),
+    after_timestamp: Optional[datetime] = None,
+    after_id: Optional[str] = None,
+    _=Depends(admin_only)
+):
     """
-    Retrieve all deleted reports from the database.
+    Retrieve deleted reports from the database, oldest first, one page at a time.
 
     Args:
         request (Request): The HTTP request object.
-        db (Session, optional): The database session dependency. Defaults to Depends(get_db).
+        limit (int, optional): The maximum number of reports to return, at most 200. Defaults to 50.
+        after_timestamp (datetime, optional): Together with after_id, only return the reports after this one.
+            Pass the "next" cursor of the previous page to get the next one.
+        after_id (str, optional): ID of the report the page starts after, see after_timestamp.
         _ (Depends, optional): Dependency to ensure the user has admin privileges. Defaults to Depends(admin_only).
 
+    Raises:
+        HTTPException: If only one of after_timestamp and after_id is given (400).
+
     Returns:
-        dict: A dictionary containing a list of deleted reports.
+        StreamingResponse: A JSON object containing a list of deleted reports, streamed as the rows are fetched,
+            and the "next" cursor ({"after_timestamp", "after_id"}), or null when there are no more reports.
+    """
+    if (after_timestamp is None) != (after_id is None):
+        raise HTTPException(status_code=400, detail="after_timestamp and after_id must be given together")
+    return StreamingResponse(iter_reports(limit, after_timestamp, after_id), media_type="application/json")
+
+def iter_reports(limit: int = REPORTS_PAGE_SIZE, after_timestamp: Optional[datetime] = None, after_id: Optional[str] = None):
+    """
+    Yield the {"reports": [...], "next": ...} JSON document piece by piece, fetching the reports in batches of 500.
+    Uses its own session, the request's session is already closed when the response is streamed.
     """
-    # Retrieve all reports
-    reports = db.query(Message).filter(Message.is_deleted == True).all()
-    return {"reports": reports}
+    query = (
+        select(Message)
+        .options(joinedload(Message.sender))
+        .where(Message.is_deleted == True)  # Same predicate as the partial index
+    )
+    if after_timestamp is not None:
+        # Keyset pagination on (timestamp, id), the page starts in the index instead of skipping rows
+        # with OFFSET. The ID breaks ties, reports sharing a timestamp are not skipped at a page boundary.
+        query = query.where(tuple_(Message.timestamp, Message.id) > tuple_(after_timestamp, after_id))
+    query = query.order_by(Message.timestamp, Message.id).limit(limit + 1)  # One extra row tells whether there is a next page
+
+    db = SessionLocal()
+    try:
+        reports = db.execute(query.execution_options(yield_per=500)).scalars()
+
+        yield b'{"reports":['
+        separator = b""
+        count = 0
+        last = None
+        next_cursor = None
+        for report in reports:
+            if count == limit:
+                next_cursor = {"after_timestamp": last.timestamp, "after_id": last.id}
+                break
+            yield separator + orjson.dumps(report_to_dict(report))
+            separator = b","
+            count += 1
+            last = report
+        yield b'],"next":' + orjson.dumps(next_cursor) + b"}"
+    finally:
+        db.close()
 
 @router.get('/reports/{reportID}', response_model=MessageResponse)
 @limiter.limit("10/minute")  # Add rate limiting
 def get_report(request: Request, reportID: str, db: Session = Depends(get_db), _=Depends(admin_only)):  # Changed from int to str
-    def get_report(request: Request, reportID: str, db: Session = Depends(get_db), _=Depends(admin_only)):
-        """
-        Retrieve detailed information about a specific report.
-
-        Args:
-            request (Request): The request object.
-            reportID (str): The ID of the report to retrieve.
-            db (Session, optional): The database session dependency. Defaults to Depends(get_db).
-            _ (Depends, optional): The admin-only dependency. Defaults to Depends(admin_only).
-
-        Raises:
-            HTTPException: If the report is not found, raises a 404 HTTP exception.
-
-        Returns:
-            dict: A dictionary containing the report details.
-        """
+    """
+    Retrieve detailed information about a specific report.
+
+    Args:
+        request (Request): The request object.
+        reportID (str): The ID of the report to retrieve.
+        db (Session, optional): The database session dependency. Defaults to Depends(get_db).
+        _ (Depends, optional): The admin-only dependency. Defaults to Depends(admin_only).
+
+    Raises:
+        HTTPException: If the report is not found, raises a 404 HTTP exception.
+
+    Returns:
+        MessageResponse: The reported message.
+    """
     # Retrieve detailed information about a specific report
-    report = db.query(Message).filter(Message.id == reportID, Message.is_deleted == True).first()
-    if not report:
+    report = db.get(Message, reportID, options=[joinedload(Message.sender)])
+    if not report or not report.is_deleted:
         raise HTTPException(status_code=404, detail="Report not found")
-    return {"report": report}
+    return report
     
-@router.get('/users', response_model=List[UserResponse])
-def get_all_users(db: Session = Depends(get_db), _=Depends(admin_only)):
+@router.get('/users', response_model=None, responses={200: {"model": List[UserResponse]}})
+def get_all_users(_=Depends(admin_only)) -> Response:
     """
     Retrieve all users from the database.
+    The serialized list is cached in Redis for a minute, it is invalidated when users are created or deleted.
 
     Args:
-        db (Session): Database session dependency.
         _ (Depends): Dependency to ensure the user has admin privileges.
 
     Returns:
-        List[User]: A list of all users in the database.
+        Response: A list of all users in the database, in the shape of UserResponse,
+                  streamed as the rows are fetched when it is not cached.
+    """
+    cache_version = None
+    if USE_REDIS:
+        cached_data = redis_client.get_cache("admin_users")
+        if cached_data:
+            return Response(content=cached_data, media_type="application/json")
+        # Read before the users are queried, a stream that overlaps an invalidation must not cache its list
+        cache_version = redis_client.get_cache_version("admin_users")
+
+    return StreamingResponse(iter_users(cache_version), media_type="application/json")
+
+def iter_users(cache_version: Optional[int] = None):
+    """
+    Yield the JSON list of users piece by piece, fetching the users in batches of 500.
+    Uses its own session, the request's session is already closed when the response is streamed.
+    With a cache_version (Redis enabled) the serialized list is cached once it is complete,
+    unless the cached list was invalidated while it was being streamed.
     """
-    # Retrieve all users
-    users = db.query(User).all()
-    return users
+    chunks = []
+    db = SessionLocal()
+    try:
+        users = db.execute(select(User).execution_options(yield_per=500)).scalars()
+
+        yield b"["
+        separator = b""
+        for user in users:
+            chunk = separator + orjson.dumps(user_to_dict(user))
+            separator = b","
+            if cache_version is not None:
+                chunks.append(chunk)
+            yield chunk
+        yield b"]"
+
+        # Only reached when the whole list has been sent. If the client disconnects,
+        # the generator is closed at a yield and the partial list is not cached.
+        if cache_version is not None:
+            redis_client.set_cache_if_version("admin_users", b"[" + b"".join(chunks) + b"]",
+                                              expiration=60, version=cache_version)
+    finally:
+        db.close()
 
 @router.get('/{id}', response_model=UserResponse)
 @limiter.limit("10/minute")
@@ -208,6 +331,35 @@ def get_user(request: Request, id: str, db: Session = Depends(get_db), _=Depends
     """
     return get_user_by_id(db, id) 
 
+@router.post('/users/bulk_ban', response_model=BulkBanUsersResponse)
+def bulk_ban_users(request: Request, body: BulkBanUsers, db: Session = Depends(get_db), admin=Depends(admin_only)):
+    """
+    Ban several users until a specified datetime.
+
+    Args:
+        request (Request): The request object.
+        body (BulkBanUsers): The IDs of the users to be banned and the datetime until which they are banned.
+        db (Session, optional): The database session. Defaults to Depends(get_db).
+        admin (Admin, optional): The admin issuing the ban. Defaults to Depends(admin_only).
+
+    Raises:
+        HTTPException: If none of the given users exist (404), like ban_user for a single user.
+
+    Returns:
+        dict: A dictionary containing the number of banned users, ban expiration datetime, admin ID, and a message.
+    """
+    # A single UPDATE ... WHERE id IN (...), unknown IDs are not counted
+    result = db.execute(
+        update(User)
+        .where(User.id.in_(body.user_ids))
+        .values(is_banned_until=body.ban_until)
+    )
+    if result.rowcount == 0:
+        raise HTTPException(status_code=404, detail="User not found")
+    db.commit()
+    return {"banned_count": result.rowcount, "banned_until": body.ban_until, "issued_by": admin.sub,
+            "message": f"{result.rowcount} users banned until {body.ban_until}"}
+
 @router.post('/users/{userID}/ban', response_model=BanUserReponse)
 def ban_user(request: Request, userID: str, ban_until: datetime, db: Session = Depends(get_db), admin=Depends(admin_only)):  # Changed from int to str
     """
@@ -223,10 +375,12 @@ def ban_user(request: Request, userID: str, ban_until: datetime, db: Session = D
     Returns:
         dict: A dictionary containing the user ID, ban expiration datetime, admin ID, and a message.
     """
-    user = get_user_by_id(db, userID)
-    user.is_banned_until = ban_until
+    # A single UPDATE instead of loading the user first, no matched row means the user does not exist
+    result = db.execute(update(User).where(User.id == userID).values(is_banned_until=ban_until))
+    if result.rowcount == 0:
+        raise HTTPException(status_code=404, detail="User not found")
     db.commit()
-    return {"user_id": userID, "banned_until": ban_until, "issued_by": admin.id, "message": f"User {userID} banned until {ban_until}"}
+    return {"user_id": userID, "banned_until": ban_until, "issued_by": admin.sub, "message": f"User {userID} banned until {ban_until}"}
 
 @router.delete('/users/{userID}/delete')
 @limiter.limit("3/minute")
@@ -234,7 +388,7 @@ def delete_user(
     request: Request,
     userID: str,  # Changed from int to str
     db: Session = Depends(get_db),
-    current_user: dict = Depends(admin_only)
+    current_user: DecodedAccessToken = Depends(admin_only)
 ):
 
     """
@@ -244,7 +398,7 @@ def delete_user(
         request (Request): The request object.
         userID (str): The ID of the user to delete.
         db (Session): The database session dependency.
-        current_user (dict): The current authenticated admin user.
+        current_user (DecodedAccessToken): The current authenticated admin user.
 
     Returns:
         dict: A message indicating the user has been deleted.
@@ -253,20 +407,38 @@ def delete_user(
         HTTPException: If the user is not found or an error occurs during deletion.
     """
     try:
-        user = db.query(User).filter(User.id == userID).first()
+        # Deleting the user cascades to their profile, reports, chats (with the messages) and sent messages,
+        # load them with one query per collection instead of one per chat or message
+        user = db.get(User, userID, options=[
+            joinedload(User.student_profile),
+            joinedload(User.tutor_profile),
+            selectinload(User.reports),
+            selectinload(User.chats_as_student).selectinload(Chat.messages).selectinload(Message.reports),
+            selectinload(User.chats_as_tutor).selectinload(Chat.messages).selectinload(Message.reports),
+            selectinload(User.messages_sent).selectinload(Message.reports)
+        ])
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         
-        logger.info(f"User {userID} deleted by admin {current_user['id']}")
+        # The other participants' cached chat lists still hold the chats deleted with the user
+        counterpart_ids = {chat.tutor_id for chat in user.chats_as_student} | {chat.student_id for chat in user.chats_as_tutor}
+
+        logger.info("User %s deleted by admin %s", userID, current_user.sub)
         db.delete(user)
         db.commit()
+        if USE_REDIS:
+            redis_client.invalidate_cache("admin_users")
+            redis_client.delete_cache(f"profile_{userID}", f"chats_{userID}",
+                                      *(f"chats_{counterpart_id}" for counterpart_id in counterpart_ids))
         return {"message": f"User {userID} deleted"}
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Error deleting user {userID}: {str(e)}")
+        logger.error("Error deleting user %s: %s", userID, e)
         db.rollback()
         raise HTTPException(status_code=500, detail="Error deleting user")
 
-@router.post('/users/create')
+@router.post('/users/create', response_model=UserCreatedResponse)
 @limiter.limit("3/minute")
 def create_user(request: Request, user_data: UserCreate, db: Session = Depends(get_db), _=Depends(admin_only)):
     """
@@ -280,30 +452,31 @@ def create_user(request: Request, user_data: UserCreate, db: Session = Depends(g
         HTTPException: If the email is already registered.
         HTTPException: If there is an error creating the user.
     Returns:
-        dict: A dictionary containing a success message and the user ID of the newly created user.
+        UserCreatedResponse: A success message and the user ID of the newly created user.
     """
     """Create a new user. Only admins can create users this way, normmally it requires gitlab authentication."""
 
     # Check if user already exists
-    if db.query(User).filter(User.email == user_data.email).first():
+    if User.get_by_email(db, user_data.email):
         raise HTTPException(status_code=400, detail="Email already registered")
     
-    # Create new user
+    # Create new user. The ID is generated here, so the user does not have to be loaded back after the commit.
+    user_id = generate_uuid()
     user = User(
+        id=user_id,
         email=user_data.email,
         name=user_data.name,
-        role=user_data.role,  # Add role from request
-        created_at=datetime.now(),
-        updated_at=datetime.now()
+        role=user_data.role  # Add role from request
     )
     
     try:
         db.add(user)
         db.commit()
-        db.refresh(user)
-        logger.info(f"New user created: {user.email}")
-        return {"message": "User created successfully", "user_id": user.id}
+        if USE_REDIS:
+            redis_client.invalidate_cache("admin_users")
+        logger.info("New user created: %s", user_data.email)
+        return {"message": "User created successfully", "user_id": user_id}
     except Exception as e:
-        logger.error(f"Error creating user: {str(e)}")
+        logger.error("Error creating user: %s", e)
         db.rollback()
         raise HTTPException(status_code=500, detail="Error creating user")
@@ -3,6 +3,7 @@ Appointment router handling scheduling functionality between students and tutors
 Includes endpoints for creating, approving, rejecting and managing appointments.
 """
 from fastapi import APIRouter, Depends, HTTPException , Request
+from fastapi.responses import ORJSONResponse, Response
 from sqlalchemy.orm import Session
 from datetime import datetime
 from database.database import get_db, User, UserRole, Appointment
@@ -10,7 +11,8 @@ from auth_tools import get_current_user
 from schemas.appointment_schema import AppointmentResponse
 from schemas.authentication_schema import DecodedAccessToken
 from database.redis import redis_client
-import json
+from utilities import appointment_to_dict
+import orjson
 #hi
 from config import get_settings
 
@@ -25,8 +27,8 @@ router = APIRouter(prefix='/appointments')
 ### - The other user can then accept or reject the meeting by making a request to
 ###      the appropriate endpoint with the meeting id.
 
-@router.post('/', response_model=AppointmentResponse)
-def schedule_meeting(request: Request, other_user_id: str, topic: str, date: datetime, current_user: DecodedAccessToken = Depends(get_current_user), db: Session = Depends(get_db)):
+@router.post('/', response_model=None, responses={200: {"model": AppointmentResponse}})
+def schedule_meeting(request: Request, other_user_id: str, topic: str, date: datetime, current_user: DecodedAccessToken = Depends(get_current_user), db: Session = Depends(get_db)) -> ORJSONResponse:
     """
     Schedule a meeting between a student and a tutor.
     Args:
@@ -44,21 +46,22 @@ def schedule_meeting(request: Request, other_user_id: str, topic: str, date: dat
     Returns:
         Appointment: The scheduled appointment.
     """
-    # Ensure the target user exists
-    target = db.query(User).filter(User.id == other_user_id).first()
+    # Ensure the target user exists. The current user's ID and role come from the token,
+    # so only the target's role is loaded, in a single query
+    target_role = db.query(User.role).filter(User.id == other_user_id).scalar()
 
-    if not target:
+    if not target_role:
         raise HTTPException(status_code=404, detail="User not found")
 
     if current_user.role == UserRole.STUDENT.value:
         # Check if the student is scheduling a meeting with a tutor
-        if target.role != UserRole.TUTOR:
+        if target_role != UserRole.TUTOR:
             raise HTTPException(status_code=403, detail="Students can only schedule meetings with tutors")
         student_id = current_user.sub
         tutor_id = other_user_id
     elif current_user.role == UserRole.TUTOR.value:
         # Check if the tutor is scheduling a meeting with a student
-        if target.role != UserRole.STUDENT:
+        if target_role != UserRole.STUDENT:
             raise HTTPException(status_code=403, detail="Tutors can only schedule meetings with students")
         student_id = other_user_id
         tutor_id = current_user.sub
@@ -71,15 +74,19 @@ def schedule_meeting(request: Request, other_user_id: str, topic: str, date: dat
         tutor_id=tutor_id,
         topic=topic,
         date=date,
-        status="pending"
+        status="pending",
+        created_by=current_user.sub
     )
     db.add(appointment)
+    db.flush()
+    # All columns are set once flushed, build the response before the commit expires them
+    # instead of loading the appointment back with a refresh
+    response = appointment_to_dict(appointment)
     db.commit()
-    db.refresh(appointment)
-    return appointment
+    return ORJSONResponse(response)
 
-@router.get('/approve/{meetingID}', response_model=AppointmentResponse)
-def approve_meeting(request: Request, meetingID: str, db: Session = Depends(get_db), current_user: DecodedAccessToken = Depends(get_current_user)):
+@router.get('/approve/{meetingID}', response_model=None, responses={200: {"model": AppointmentResponse}})
+def approve_meeting(request: Request, meetingID: str, db: Session = Depends(get_db), current_user: DecodedAccessToken = Depends(get_current_user)) -> ORJSONResponse:
     """
     Approve a meeting request.
     Args:
@@ -96,7 +103,7 @@ def approve_meeting(request: Request, meetingID: str, db: Session = Depends(get_
         Appointment: The approved appointment object.
     """
     # Approve a meeting request
-    appointment = db.query(Appointment).filter(Appointment.id == meetingID).first()
+    appointment = db.get(Appointment, meetingID)
     if not appointment:
         raise HTTPException(status_code=404, detail="Meeting not found")
 
@@ -109,11 +116,15 @@ def approve_meeting(request: Request, meetingID: str, db: Session = Depends(get_
         raise HTTPException(status_code=403, detail="User not authorized to approve meeting")
 
     appointment.status = "scheduled"
+    # Build the response before the commit expires the appointment, instead of loading it back
+    response = appointment_to_dict(appointment)
     db.commit()
-    return appointment
+    if USE_REDIS:
+        redis_client.delete_cache(f"appointment_{meetingID}")  # Drop the cached copy of get_meeting
+    return ORJSONResponse(response)
 
-@router.get('/reject/{meetingID}', response_model=AppointmentResponse)
-def reject_meeting(request: Request, meetingID: str, db: Session = Depends(get_db), current_user: DecodedAccessToken = Depends(get_current_user)):
+@router.get('/reject/{meetingID}', response_model=None, responses={200: {"model": AppointmentResponse}})
+def reject_meeting(request: Request, meetingID: str, db: Session = Depends(get_db), current_user: DecodedAccessToken = Depends(get_current_user)) -> ORJSONResponse:
     """
     Reject a meeting request.
     Args:
@@ -129,7 +140,7 @@ def reject_meeting(request: Request, meetingID: str, db: Session = Depends(get_d
         Appointment: The updated appointment object with status set to "rejected".
     """
     # Reject a meeting request
-    appointment = db.query(Appointment).filter(Appointment.id == meetingID).first()
+    appointment = db.get(Appointment, meetingID)
     if not appointment:
         raise HTTPException(status_code=404, detail="Meeting not found")
 
@@ -142,16 +153,20 @@ def reject_meeting(request: Request, meetingID: str, db: Session = Depends(get_d
         raise HTTPException(status_code=403, detail="User not authorized to reject meeting")
 
     appointment.status = "rejected"
+    # Build the response before the commit expires the appointment, instead of loading it back
+    response = appointment_to_dict(appointment)
     db.commit()
-    return appointment
+    if USE_REDIS:
+        redis_client.delete_cache(f"appointment_{meetingID}")  # Drop the cached copy of get_meeting
+    return ORJSONResponse(response)
 
-@router.get('/{meetingID}', response_model=AppointmentResponse)
+@router.get('/{meetingID}', response_model=None, responses={200: {"model": AppointmentResponse}})
 def get_meeting(
     request: Request,
     meetingID: str,
     current_user: DecodedAccessToken = Depends(get_current_user),
     db: Session = Depends(get_db)
-):
+) -> Response:
     """
     Fetch details about a specific meeting.
 
@@ -162,37 +177,39 @@ def get_meeting(
         db (Session): The database session dependency.
 
     Returns:
-        Appointment: The appointment details.
+        Response: The appointment details, in the shape of AppointmentResponse.
 
     Raises:
         HTTPException: If the user is not authorized to view the meeting or if the meeting is not found.
     """
-    if USE_REDIS:
-        cache_key = f"appointment_{meetingID}"
-        cached_data = redis_client.get_cache(cache_key)
-        if cached_data:
-            print('returning cached data (Appointments)')
-            return json.loads(cached_data)
-
-    # Fetch details about a specific meeting
-    appointment = db.query(Appointment).filter(Appointment.id == meetingID).first()
+    # The appointment is cached as the serialized response. On a cache hit the
+    # participants are read back from it, the authorization check still applies.
+    cache_key = f"appointment_{meetingID}"
+    data = redis_client.get_cache(cache_key) if USE_REDIS else None
+    if data:
+        cached = orjson.loads(data)
+        student_id, tutor_id = cached["student_id"], cached["tutor_id"]
+    else:
+        # Fetch details about a specific meeting
+        appointment = db.get(Appointment, meetingID)
+        if not appointment:
+            raise HTTPException(status_code=404, detail="Meeting not found")
+        student_id, tutor_id = appointment.student_id, appointment.tutor_id
+        data = orjson.dumps(appointment_to_dict(appointment))
+        if USE_REDIS:
+            redis_client.set_cache(cache_key, data, expiration=600)  # Cache for 10 minutes
 
     # Check if the user is authorized to view the meeting
     if current_user.role != UserRole.ADMIN.value:
-        if current_user.role == UserRole.STUDENT.value and appointment.student_id != current_user.sub:
+        if current_user.role == UserRole.STUDENT.value and student_id != current_user.sub:
             raise HTTPException(status_code=403, detail="User not authorized to view meeting")  
-        if current_user.role == UserRole.TUTOR.value and appointment.tutor_id != current_user.sub:
+        if current_user.role == UserRole.TUTOR.value and tutor_id != current_user.sub:
             raise HTTPException(status_code=403, detail="User not authorized to view meeting")
 
-    if not appointment:
-        raise HTTPException(status_code=404, detail="Meeting not found")
-    if USE_REDIS:
-        redis_client.set_cache(cache_key, json.dumps(appointment), expiration=600)  # Cache for 10 minutes
-
-    return appointment
+    return Response(content=data, media_type="application/json")
 
-@router.patch('/update/{meetingID}', response_model=AppointmentResponse)
-def update_meeting(request: Request, meetingID: str, topic: str = None, date: datetime = None, status: str = None, current_user:DecodedAccessToken=Depends(get_current_user), db: Session = Depends(get_db)):
+@router.patch('/update/{meetingID}', response_model=None, responses={200: {"model": AppointmentResponse}})
+def update_meeting(request: Request, meetingID: str, topic: str = None, date: datetime = None, status: str = None, current_user:DecodedAccessToken=Depends(get_current_user), db: Session = Depends(get_db)) -> ORJSONResponse:
     """
     Update details of a specific meeting.
     Args:
@@ -210,7 +227,9 @@ def update_meeting(request: Request, meetingID: str, topic: str = None, date: da
         Appointment: The updated appointment object.
     """
     # Update details of a specific meeting
-    appointment = db.query(Appointment).filter(Appointment.id == meetingID).first()
+    appointment = db.get(Appointment, meetingID)
+    if not appointment:
+        raise HTTPException(status_code=404, detail="Meeting not found")
 
     # Check if the user is authorized to update the meeting
     if current_user.role != UserRole.ADMIN.value:
@@ -219,9 +238,6 @@ def update_meeting(request: Request, meetingID: str, topic: str = None, date: da
         if current_user.role == UserRole.TUTOR.value and appointment.tutor_id != current_user.sub:
             raise HTTPException(status_code=403, detail="User not authorized to update meeting")
 
-    if not appointment:
-        raise HTTPException(status_code=404, detail="Meeting not found")
-
     if topic:
         appointment.topic = topic
     if date:
@@ -232,11 +248,15 @@ def update_meeting(request: Request, meetingID: str, topic: str = None, date: da
     # Meeting status is now "pending" after updating
     appointment.status = "pending"
 
+    # Build the response before the commit expires the appointment, instead of loading it back
+    response = appointment_to_dict(appointment)
     db.commit()
-    return appointment
+    if USE_REDIS:
+        redis_client.delete_cache(f"appointment_{meetingID}")  # Drop the cached copy of get_meeting
+    return ORJSONResponse(response)
 
-@router.delete('/cancel/{meetingID}', response_model=AppointmentResponse)
-def cancel_meeting(request: Request, meetingID: str, current_user:DecodedAccessToken=Depends(get_current_user), db: Session = Depends(get_db)):
+@router.delete('/cancel/{meetingID}', response_model=None, responses={200: {"model": AppointmentResponse}})
+def cancel_meeting(request: Request, meetingID: str, current_user:DecodedAccessToken=Depends(get_current_user), db: Session = Depends(get_db)) -> ORJSONResponse:
     """
     Cancel a specific meeting.
     Args:
@@ -250,7 +270,9 @@ def cancel_meeting(request: Request, meetingID: str, current_user:DecodedAccessT
     Returns:
         Appointment: The canceled appointment object.
     """
-    appointment = db.query(Appointment).filter(Appointment.id == meetingID).first()
+    appointment = db.get(Appointment, meetingID)
+    if not appointment:
+        raise HTTPException(status_code=404, detail="Meeting not found")
 
     # Check if the user is authorized to cancel the meeting
     if current_user.role != UserRole.ADMIN.value:
@@ -259,9 +281,10 @@ def cancel_meeting(request: Request, meetingID: str, current_user:DecodedAccessT
         if current_user.role == UserRole.TUTOR.value and appointment.tutor_id != current_user.sub:
             raise HTTPException(status_code=403, detail="User not authorized to cancel meeting")
 
-    if not appointment:
-        raise HTTPException(status_code=404, detail="Meeting not found")
-
     appointment.status = "cancelled"
+    # Build the response before the commit expires the appointment, instead of loading it back
+    response = appointment_to_dict(appointment)
     db.commit()
-    return appointment
+    if USE_REDIS:
+        redis_client.delete_cache(f"appointment_{meetingID}")  # Drop the cached copy of get_meeting
+    return ORJSONResponse(response)
@@ -3,10 +3,10 @@ Authentication router handling OAuth2 login flow with GitLab, user signup, token
 Implements JWT token based authentication with access and refresh tokens.
 """
 from fastapi import FastAPI, Depends, HTTPException, Request, APIRouter, Header
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2AuthorizationCodeBearer, OAuth2PasswordBearer
-from fastapi.responses import RedirectResponse
-from typing import List
-from starlette.config import Config
+from fastapi.responses import RedirectResponse, ORJSONResponse, Response
+from typing import List, Final
 from starlette.middleware.sessions import SessionMiddleware
 from authlib.integrations.starlette_client import OAuth
 from typing import Union, Optional, Tuple
@@ -23,10 +23,15 @@ from database.redis import redis_client
 from config import get_settings
 import uuid
 import os
-import requests
+import httpx
+from urllib.parse import quote
+import orjson
+
+# Settings are resolved once, the constants below are plain attribute reads
+settings = get_settings()
 
 # Check if we should use Redis
-USE_REDIS = get_settings().use_redis
+USE_REDIS = settings.use_redis
 
 # Add OAuth2 scheme configuration
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
@@ -34,49 +39,107 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 # Initialize app
 router = APIRouter(prefix='/auth')
 
-# Add rate limiting
-limiter = Limiter(key_func=get_remote_address)
+# Add rate limiting. With Redis the counters are shared by all workers instead of kept per process.
+# The moving window counts the requests of the last period, a fixed window allows a burst
+# of twice the limit around the window boundary.
+if USE_REDIS:
+    redis_auth = f":{quote(settings.redis_password, safe='')}@" if settings.redis_password else ""
+    limiter_storage_uri = f"redis://{redis_auth}{settings.redis_host}:{settings.redis_port}"
+else:
+    limiter_storage_uri = "memory://"
+limiter = Limiter(key_func=get_remote_address, storage_uri=limiter_storage_uri, strategy="moving-window")
 
 # Add OAuth configuration constants
-GITLAB_CLIENT_ID = get_settings().gitlab_client_id
-GITLAB_CLIENT_SECRET = get_settings().gitlab_client_secret
-GITLAB_REDIRECT_URI = get_settings().gitlab_redirect_uri
-GITLAB_BASE_URL = get_settings().gitlab_base_url
-GITLAB_API_URL = get_settings().gitlab_api_url
+GITLAB_CLIENT_ID = settings.gitlab_client_id
+GITLAB_CLIENT_SECRET = settings.gitlab_client_secret
+GITLAB_REDIRECT_URI = settings.gitlab_redirect_uri
+GITLAB_BASE_URL = settings.gitlab_base_url
+GITLAB_API_URL = settings.gitlab_api_url
+GITLAB_METADATA_URL: Final = f"{GITLAB_BASE_URL}/.well-known/openid-configuration"
+
+class SharedTransport(httpx.AsyncHTTPTransport):
+    """
+    Connection pool shared by all requests to GitLab.
+    Authlib opens and closes a new client for every OAuth request, closing the
+    client must not close the pool, otherwise connections could not be reused.
+    """
+    async def __aexit__(self, *args):
+        pass
+
+    async def aclose(self):
+        pass
+
+    async def close_pool(self):
+        """Close the underlying connection pool, call this on shutdown"""
+        await super().aclose()
+
+# Keep-alive connections to GitLab are reused across logins
+gitlab_transport = SharedTransport(http2=True, limits=httpx.Limits(max_keepalive_connections=32, max_connections=64))
+gitlab_http = httpx.AsyncClient(transport=gitlab_transport, timeout=5.0)
 
 # Initialize OAuth only if credentials are available
 oauth = None
 gitlab = None
+_authorize_redirect = None
+_authorize_access_token = None
 
 if GITLAB_CLIENT_ID and GITLAB_CLIENT_SECRET:
     try:
-        config = Config(environ={
-            "GITLAB_CLIENT_ID": GITLAB_CLIENT_ID,
-            "GITLAB_CLIENT_SECRET": GITLAB_CLIENT_SECRET,
-            "GITLAB_SERVER_METADATA_URL": f"{GITLAB_BASE_URL}/.well-known/openid-configuration",
-            "GITLAB_REDIRECT_URI": GITLAB_REDIRECT_URI,
-        })
-        
-        oauth = OAuth(config)
+        oauth = OAuth()
         gitlab = oauth.register(
             name="gitlab",
             client_id=GITLAB_CLIENT_ID,
             client_secret=GITLAB_CLIENT_SECRET,
-            server_metadata_url=f"{GITLAB_BASE_URL}/.well-known/openid-configuration",
-            client_kwargs={"scope": "openid profile email read_user"},
+            server_metadata_url=GITLAB_METADATA_URL,
+            client_kwargs={"scope": "openid profile email read_user", "transport": gitlab_transport, "timeout": 5.0},
         )
+        # Bound once, the handlers call these directly
+        _authorize_redirect = gitlab.authorize_redirect
+        _authorize_access_token = gitlab.authorize_access_token
         logger.info("GitLab OAuth initialized successfully")
     except Exception as e:
-        logger.error(f"Failed to initialize GitLab OAuth: {str(e)}")
+        logger.error("Failed to initialize GitLab OAuth: %s", e)
         raise e
 
+async def load_gitlab_metadata():
+    """
+    Fetch the GitLab OpenID configuration and signing keys (JWKS) once at startup.
+    Authlib keeps both on the client and validates ID tokens against the cached keys,
+    so the first login does not have to wait for the discovery and JWKS requests.
+    The keys are only fetched again if GitLab signs a token with an unknown key.
+    """
+    if not gitlab:
+        return
+
+    try:
+        await gitlab.load_server_metadata()
+        await gitlab.fetch_jwk_set()
+        logger.info("GitLab OpenID configuration and signing keys loaded")
+    except Exception as e:
+        # Not fatal, authlib will retry on the first login
+        logger.error("Failed to load GitLab OpenID configuration: %s", e)
+
+async def close_gitlab_connections():
+    """Close the connections to GitLab on shutdown"""
+    await gitlab_http.aclose()
+    await gitlab_transport.close_pool()
+
 # Add these constants
-SECRET_KEY = get_settings().secret_key
-ALGORITHM = get_settings().hash_algorithm
-TOKEN_EXPIRE_MINUTES = get_settings().access_token_expire_minutes 
-REFRESH_TOKEN_EXPIRE_DAYS = get_settings().refresh_token_expire_days
+SECRET_KEY = settings.secret_key
+ALGORITHM = settings.hash_algorithm
+TOKEN_EXPIRE_MINUTES = settings.access_token_expire_minutes 
+REFRESH_TOKEN_EXPIRE_DAYS = settings.refresh_token_expire_days
 
 
+# GitLab group to role mapping, in order of priority
+GITLAB_GROUP_PREFIX = 'lsit-tutoring-platform/'
+GROUP_TO_ROLE = {
+    GITLAB_GROUP_PREFIX + 'admins': UserRole.ADMIN,
+    GITLAB_GROUP_PREFIX + 'students': UserRole.STUDENT,
+    GITLAB_GROUP_PREFIX + 'tutors': UserRole.TUTOR
+}
+ROLE_GROUPS = frozenset(GROUP_TO_ROLE)
+
 # Token store
 # This is a simple in-memory store for demonstration purposes, we should replace this with a database
 # like Redis
@@ -95,8 +158,8 @@ def create_user_in_db(db: Session, user_data: dict, is_temp_admin: bool = False,
     """
     if is_temp_admin:
         user_data = {
-            "name": get_settings().admin_name,
-            "email": get_settings().admin_email,
+            "name": settings.admin_name,
+            "email": settings.admin_email,
             "role": UserRole.ADMIN.name
         }
     else:
@@ -107,7 +170,7 @@ def create_user_in_db(db: Session, user_data: dict, is_temp_admin: bool = False,
         assert 'email' != 'admin@example.com', "Email cannot be 'admin@example.com', as it is reserved for temporary admin accounts"
 
     # Check if the user already exists
-    user = db.query(User).filter(User.email == user_data['email']).first()
+    user = User.get_by_email(db, user_data['email'])
     if user:
         if not replace:
             return user # Return the existing user
@@ -124,22 +187,23 @@ def create_user_in_db(db: Session, user_data: dict, is_temp_admin: bool = False,
     db.add(user)
     db.commit()
     db.refresh(user)
+    if USE_REDIS:
+        redis_client.invalidate_cache("admin_users")  # Cached user list of the admin router
     return user
 
 def role_from_gitlab_group(user_groups: list) -> UserRole:
-    group_pre = 'lsit-tutoring-platform/'
-    role_mapping = {
-        group_pre + 'admins': UserRole.ADMIN,
-        group_pre + 'students': UserRole.STUDENT,
-        group_pre + 'tutors': UserRole.TUTOR
-    }
-    
-    for group, role in role_mapping.items():
-        if group in user_groups:
-            return role
-            
+    """Determine the role of a user from their GitLab groups"""
+    # Only the role groups the user is a member of, in a single pass over their groups
+    matched = ROLE_GROUPS.intersection(user_groups)
+
     # Default to STUDENT if no matching role found
-    return UserRole.STUDENT
+    if not matched:
+        return UserRole.STUDENT
+
+    # Groups are checked in order of priority
+    for group, role in GROUP_TO_ROLE.items():
+        if group in matched:
+            return role
 
 # Optional gitlab token dependency
 def get_gitlab_token(authorization: Optional[str] = Header(None)):
@@ -150,12 +214,12 @@ def get_gitlab_token(authorization: Optional[str] = Header(None)):
     return None  # Return None if no token is provided
 
 # Function to fetch GitLab user data using the access token
-def get_gitlab_user_data(access_token: str):
+async def get_gitlab_user_data(access_token: str):
     headers = {
         "Authorization": f"Bearer {access_token}",
     }
 
-    response = requests.get(f'{GITLAB_API_URL}', headers=headers)
+    response = await gitlab_http.get(GITLAB_API_URL, headers=headers)
 
     if response.status_code != 200:
         raise HTTPException(status_code=response.status_code, detail="GitLab authentication failed")
@@ -195,6 +259,21 @@ def create_refresh_token(user_id: str) -> Tuple[str, str]:  # Changed from int t
 
     return refresh_token, token_id
 
+def login_existing_user(db: Session, email: str) -> Optional[dict]:
+    """Issue a new token pair for an existing user, returns None if there is no user with this email.
+    This blocks on the database (and Redis), async endpoints must run it with run_in_threadpool."""
+    user = User.get_by_email(db, email)
+    if not user:
+        return None
+
+    # Create a refresh token
+    refresh_token, refresh_token_id = create_refresh_token(user.id)
+
+    # Create an access token
+    access_token = create_access_token(user.id, user.name, user.email, user.role.name, refresh_token_id)
+
+    return {"access_token": access_token, "refresh_token" : refresh_token, "token_type": "bearer", "status": "logged_in"}
+
 def create_signup_token(user_id: str, name: str, email: str, role: str, expires_in=5):  # Changed from int
     """Create a JWT token for new users to sign up"""
     to_encode = {
@@ -215,8 +294,8 @@ def verify_token(token: str = Depends(oauth2_scheme)):
     except JWTError: # Invalid or expired token
         raise HTTPException(status_code=401, detail="Invalid token")
 
-@router.post("/refresh", response_model=LoggedInResponse)
-async def refresh_token(request: Request, db = Depends(get_db), payload : DecodedRefreshToken = Depends(get_refresh_token)):
+@router.post("/refresh", response_model=None, responses={200: {"model": LoggedInResponse}})
+def refresh_token(request: Request, db = Depends(get_db), payload : DecodedRefreshToken = Depends(get_refresh_token)) -> ORJSONResponse:
     """Endpoint to refresh an expired access token using refresh token"""
     try:
         if not payload:
@@ -240,7 +319,7 @@ async def refresh_token(request: Request, db = Depends(get_db), payload : Decode
             raise HTTPException(status_code=401, detail="Invalid refresh token. The refresh token may have expired.")
 
         # Get user data from the database
-        user = db.query(User).filter(User.id == payload.sub).first()
+        user = db.get(User, payload.sub)
             
         # Create new access token
         access_token = create_access_token(user_id=payload.sub,
@@ -249,100 +328,75 @@ async def refresh_token(request: Request, db = Depends(get_db), payload : Decode
                                            role=user.role.name,
                                            refresh_token_id=payload.token_id)
 
-        return {"access_token": access_token, "refresh_token": jwt.encode(payload.model_dump(), key=SECRET_KEY, algorithm=ALGORITHM), "token_type": "bearer", "status": "logged_in"}
+        return ORJSONResponse({"access_token": access_token, "refresh_token": jwt.encode(payload.model_dump(), key=SECRET_KEY, algorithm=ALGORITHM), "token_type": "bearer", "status": "logged_in"})
     except JWTError:
         raise HTTPException(status_code=401, detail="Invalid refresh token")
 
-@router.get("/login", response_model=Union[LoggedInResponse, SignUpResponse, None])
+@router.get("/login", response_model=None, responses={200: {"model": Union[LoggedInResponse, SignUpResponse]}})
 @limiter.limit("10/minute")
-async def login(request: Request, gitlab_token = Depends(get_gitlab_token), db = Depends(get_db)):
+async def login(request: Request, gitlab_token = Depends(get_gitlab_token), db = Depends(get_db)) -> Response:
     if not GITLAB_CLIENT_ID or not GITLAB_CLIENT_SECRET:
         raise HTTPException(status_code=500, detail="GitLab client credentials not set. Cannot use this endpoint.")
 
     """Login endpoint"""
     # Fetch user info using the token with the gitlab object
     if (gitlab_token):
-        user_info = get_gitlab_user_data(gitlab_token)
-
-        role = role_from_gitlab_group(user_info['groups'])
-        print(role)
-
-        # Check if the user exists
-        user = db.query(User).filter(User.email == user_info['email']).first()
-
-
-        if user:
-            logger.info(f"Logging in user {user.name}.")
+        user_info = await get_gitlab_user_data(gitlab_token)
 
-            # Create a refresh token
-            refresh_token, refresh_token_id = create_refresh_token(user.id)
+        # Log in the user if they exist, without blocking the event loop on the database
+        tokens = await run_in_threadpool(login_existing_user, db, user_info['email'])
 
-            # Create an access token
-            access_token = create_access_token(user.id, user.name, user.email, user.role.name, refresh_token_id)
+        if tokens:
+            logger.info("User %s logged in.", user_info['name'])
 
-            logger.info(f"Success. User {user.name} logged in.")
+            return ORJSONResponse(tokens)
 
-            return {"access_token": access_token, "refresh_token" : refresh_token, "token_type": "bearer", "status": "logged_in"}
+        logger.info("User %s not found in the database.", user_info['name'])
 
-        logger.info(f"User {user_info['name']} not found in the database.")
+        # The role is only needed for new users, existing users keep the role stored in the database
+        role = role_from_gitlab_group(user_info['groups'])
 
         # If the user does not exist, provide the client with a one time token to create an account
         token = create_signup_token(user_info['sub'], user_info['name'], user_info['email'], role)
     
-        return {"message": "New user, sign up required", "status": "signup_required", "redirect_to": "/auth/signup?token=" + token}
+        return ORJSONResponse({"message": "New user, sign up required", "status": "signup_required", "redirect_to": "/auth/signup?token=" + token})
 
     try:
-        redirect_uri = GITLAB_REDIRECT_URI
-        response = await gitlab.authorize_redirect(request, redirect_uri)
-        return response
+        return await _authorize_redirect(request, GITLAB_REDIRECT_URI)
     except Exception as e:
-        logger.error(f"Login error: {repr(e)}")
+        logger.error("Login error: %r", e)
         raise HTTPException(status_code=500, detail="Authentication failed")
 
-@router.get('/callback', response_model=Union[LoggedInResponse, SignUpResponse])
-async def auth_callback(request: Request, db = Depends(get_db)):
+@router.get('/callback', response_model=None, responses={200: {"model": Union[LoggedInResponse, SignUpResponse]}})
+async def auth_callback(request: Request, db = Depends(get_db)) -> ORJSONResponse:
     """Callback endpoint after successful authentication with GitLab. Returns a JWT token which should be used by the client"""
     try:
         # Retrieve the access token from GitLab
-        token = await gitlab.authorize_access_token(request)
+        token = await _authorize_access_token(request)
         # Fetch user information
         user_data = token.get('userinfo')
     except Exception as e:
         raise HTTPException(status_code=400, detail="Authorization failed")
 
-    # Determine role of user
-    group_pre = 'lsit-tutoring-platform/'
-    group_names = [group_pre + stub for stub in ['admins', 'students', 'tutors']]
-    role_names = ['admin', 'student', 'tutor']
-    role = ""
-    for i, group in enumerate(group_names):
-        if group in user_data['groups_direct']:
-            role = role_names[i]
-            break
-
-    # Check if the user is already in the database, by email
-    user = db.query(User).filter(User.email == user_data['email']).first()
-
-    # If the user exists, log them in by giving them a new access token
-    if user:
-        # Create a refresh token
-        refresh_token, refresh_token_id = create_refresh_token(user.id)
+    # If the user is already in the database (by email), log them in by giving them a new access token
+    tokens = await run_in_threadpool(login_existing_user, db, user_data['email'])
 
-        # Create an access token
-        access_token = create_access_token(user.id, user.name, user.email, user.role.name, refresh_token_id)
+    if tokens:
+        return ORJSONResponse(tokens)
 
-        return {"access_token": access_token, "refresh_token" : refresh_token, "token_type": "bearer", "status": "logged_in"}
+    # Determine role of the new user, existing users keep the role stored in the database
+    role = role_from_gitlab_group(user_data.get('groups_direct', []))
 
     # If the user does not exist, provide the client with a one time token to create an account
     token = create_signup_token(user_data['sub'], user_data['name'], user_data['email'], role)
 
-    return {'message': 'New user, sign up required.',
-            'status': 'signup_required',
-            'redirect_to': f'/auth/signup?token={token}'} # Include the token in the redirect URL
+    return ORJSONResponse({'message': 'New user, sign up required.',
+                           'status': 'signup_required',
+                           'redirect_to': f'/auth/signup?token={token}'}) # Include the token in the redirect URL
 
-@router.post("/signup", response_model=LoggedInResponse)
+@router.post("/signup", response_model=None, responses={200: {"model": LoggedInResponse}})
 @limiter.limit("10/minute")
-def signup(request : Request, token: str, db = Depends(get_db)):
+def signup(request : Request, token: str, db = Depends(get_db)) -> ORJSONResponse:
     """Sign up endpoint. Requires a one time JWT token which is generated after successful authentication - see auth_callback."""
     
     if not GITLAB_CLIENT_ID or not GITLAB_CLIENT_SECRET:
@@ -352,7 +406,7 @@ def signup(request : Request, token: str, db = Depends(get_db)):
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
 
         # Check if the user already exists
-        user = db.query(User).filter(User.email == payload['email']).first()
+        user = User.get_by_email(db, payload['email'])
 
         if user:
             raise HTTPException(status_code=400, detail="User already exists")
@@ -366,27 +420,33 @@ def signup(request : Request, token: str, db = Depends(get_db)):
         # Generate an access token
         access_token = create_access_token(user.id, user.name, user.email, user.role.name, refresh_token_id)
 
-        return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer", "status": "logged_in"}
+        return ORJSONResponse({"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer", "status": "logged_in"})
     except JWTError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
-@router.get("/secure")
-def secure_data(user: DecodedAccessToken = Depends(get_current_user)):
+@router.get("/secure", response_model=None, responses={200: {"description": "Secure data and the decoded token"}})
+def secure_data(user: DecodedAccessToken = Depends(get_current_user)) -> ORJSONResponse:
     """Secure endpoint that requires a valid token"""
-    return {"message": "You have accessed secure data!", "user": user.model_dump()}
+    return ORJSONResponse({"message": "You have accessed secure data!", "user": user.model_dump()})
 
-@router.get("/logout", response_model=LoggedOutResponse)
-async def logout(request: Request, user: DecodedAccessToken = Depends(get_current_user)):
-    # Invalidate the refresh token
-    if USE_REDIS:
-        redis_client.delete_refresh_token(user.refresh_token_id)
-    else:
-        del refresh_token_store[user.refresh_token_id]
+# The logout response never changes, serialize it once
+LOGGED_OUT_BODY: Final = orjson.dumps(
+    LoggedOutResponse(message="Logged out successfully. Refresh token invalidated.", status="logged_out").model_dump()
+)
+
+@router.get("/logout", response_model=None, responses={200: {"model": LoggedOutResponse}})
+async def logout(request: Request, user: DecodedAccessToken = Depends(get_current_user)) -> Response:
+    # Invalidate the refresh token, tokens without one have nothing to invalidate
+    if user.refresh_token_id:
+        if USE_REDIS:
+            await run_in_threadpool(redis_client.delete_refresh_token, user.refresh_token_id)
+        else:
+            refresh_token_store.pop(user.refresh_token_id, None)
     
-    return {"message": "Logged out successfully. Refresh token invalidated.", "status": "logged_out"}
+    return Response(content=LOGGED_OUT_BODY, media_type="application/json")
 
-@router.get("/generate-admin-token")
-def generate_admin_token(request: Request, response_model=LoggedInResponse, db : Session = Depends(get_db), _ = Depends(verify_localhost)):
+@router.get("/generate-admin-token", response_model=None, responses={200: {"model": LoggedInResponse}})
+def generate_admin_token(request: Request, db : Session = Depends(get_db), _ = Depends(verify_localhost)) -> ORJSONResponse:
     """
     Generate a temporary admin token for development purposes.
     Creates an admin user if it does not exist.
@@ -395,7 +455,7 @@ def generate_admin_token(request: Request, response_model=LoggedInResponse, db :
     """
 
     # Only allow this endpoint in development
-    if not get_settings().local:
+    if not settings.local:
         raise HTTPException(status_code=403, detail="Forbidden")
 
     # Create a temporary admin account if it does not exist
@@ -404,5 +464,5 @@ def generate_admin_token(request: Request, response_model=LoggedInResponse, db :
     # Generate an access token
     access_token = create_access_token(user.id, user.name, user.email, user.role.name, "") # No refresh token for this type of token
 
-    return {"access_token": access_token, "refresh_token": "", "token_type": "bearer", "status": "logged_in"}
+    return ORJSONResponse({"access_token": access_token, "refresh_token": "", "token_type": "bearer", "status": "logged_in"})
 
@@ -3,26 +3,26 @@ Chat router handling messaging functionality between users.
 Includes endpoints for viewing chats, sending messages and managing chat history.
 """
 from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import ORJSONResponse, Response
 from sqlalchemy.orm import Session
 from typing import List
-from datetime import datetime
 from auth_tools import get_current_user
-from database.database import get_db, User, Message, UserRole, is_valid_uuid, Chat
+from database.database import get_db, generate_uuid, User, Message, UserRole, is_valid_uuid, Chat
 from config import get_settings
-from utilities import get_user_by_id, get_user_chats, get_chat_with_messages
+from utilities import get_user_by_id, get_user_chats, get_chat_with_messages, chat_to_dict
 from schemas.chat_schema import ChatResponse, MessageResponse, ChatCreate
 from schemas.authentication_schema import DecodedAccessToken
 from logger import logger
 from database.redis import redis_client
-import json
+import orjson
 from config import get_settings
 #hi
 # Check if we should use Redis
 USE_REDIS = get_settings().use_redis
 router = APIRouter(prefix='/chats')
 
-@router.get('/', response_model=List[ChatResponse])
-def get_chats(request: Request, current_user=Depends(get_current_user), db: Session=Depends(get_db)):
+@router.get('/', response_model=None, responses={200: {"model": List[ChatResponse]}})
+def get_chats(request: Request, current_user=Depends(get_current_user), db: Session=Depends(get_db)) -> Response:
     """
     Retrieve detailed chat information for the current user.
     Args:
@@ -34,42 +34,27 @@ def get_chats(request: Request, current_user=Depends(get_current_user), db: Sess
                     chat ID, student details, tutor details, and timestamps for creation and updates.
     The function performs the following steps:
     1. Retrieves the current user from the database using their ID.
-    2. Fetches the chats associated with the user based on their role.
-    3. Constructs a detailed representation of each chat, including student and tutor details.
-    4. Optionally caches the result for improved performance.
-    Note:
-        The 'created_at' field for both student and tutor is set to None in the detailed representation.
+    2. Fetches the chats associated with the user based on their role, with the students and tutors in the same query.
+    3. Constructs a detailed representation of each chat, including student and tutor details (without messages).
+    4. Caches the serialized result in Redis, a cache hit is returned without decoding it.
     """
+    # The cached list is dropped when a chat of the user is created or a message is sent
+    cache_key = f"chats_{current_user.sub}"
+    if USE_REDIS:
+        cached_data = redis_client.get_cache(cache_key)
+        if cached_data:
+            return Response(content=cached_data, media_type="application/json")
+
     user = get_user_by_id(db, current_user.sub)
     chats = get_user_chats(db, user.id, user.role)
-    detailed_chats = []
-    for chat in chats:
-        detailed_chats.append({
-            "id": chat.id,
-            "student": {
-                "id": chat.student.id,
-                "email": chat.student.email,
-                "role": chat.student.role,
-                "name": chat.student.name,
-                "created_at": None
-            },
-            "tutor": {
-                "id": chat.tutor.id,
-                "email": chat.tutor.email,
-                "role": chat.tutor.role,
-                "name": chat.tutor.name,
-                "created_at": None
-            },
-            "created_at": chat.created_at,
-            "updated_at": chat.updated_at
-        })
-    # Optionally, cache the result
-    # redis_client.set_cache(cache_key, json.dumps(detailed_chats), expiration=600)
+    data = orjson.dumps([chat_to_dict(chat, include_messages=False) for chat in chats])
+    if USE_REDIS:
+        redis_client.set_cache(cache_key, data, expiration=60)  # Short expiry, user name changes are not tracked
 
-    return detailed_chats
+    return Response(content=data, media_type="application/json")
 
-@router.get('/{chatID}', response_model=ChatResponse)
-def get_chat(chatID: str, current_user: DecodedAccessToken = Depends(get_current_user), db: Session = Depends(get_db)):  # Changed from int to str
+@router.get('/{chatID}', response_model=None, responses={200: {"model": ChatResponse}})
+def get_chat(chatID: str, current_user: DecodedAccessToken = Depends(get_current_user), db: Session = Depends(get_db)) -> ORJSONResponse:  # Changed from int to str
     """
     Retrieve a chat by its ID.
     Args:
@@ -81,27 +66,29 @@ def get_chat(chatID: str, current_user: DecodedAccessToken = Depends(get_current
         HTTPException: If the chat is not found (status code 404).
         HTTPException: If the user does not have access to the chat (status code 403).
     Returns:
-        Chat: The chat object if found and accessible by the user.
+        ORJSONResponse: The chat with its messages, in the shape of ChatResponse, if found and accessible by the user.
     """
     if not is_valid_uuid(chatID):
         raise HTTPException(status_code=400, detail="Invalid chat ID format")
-    chat = db.query(Chat).filter(Chat.id == chatID).first()
-    if not chat:
+    # Only the participants are needed for the access check
+    participants = db.query(Chat.student_id, Chat.tutor_id).filter(Chat.id == chatID).first()
+    if not participants:
         raise HTTPException(status_code=404, detail="Chat not found")
     
     # Verify user has access to this chat
-    if chat.student_id != current_user.sub and chat.tutor_id != current_user.sub:
+    if current_user.sub not in participants:
         raise HTTPException(status_code=403, detail="Access denied")
         
-    return chat
+    # Loads the messages with selectinload, see get_chat_with_messages
+    return ORJSONResponse(chat_to_dict(get_chat_with_messages(db, chatID)))
 
-@router.post('/', response_model=ChatResponse)
+@router.post('/', response_model=None, responses={200: {"model": ChatResponse}})
 def create_chat(
     request: Request,
     chat_data: ChatCreate,
     current_user: DecodedAccessToken = Depends(get_current_user),
     db: Session = Depends(get_db)
-):
+) -> ORJSONResponse:
     """Create a new chat between a student and tutor"""
     try:
         # Get current user
@@ -118,24 +105,27 @@ def create_chat(
         if existing_chat:
             raise HTTPException(status_code=400, detail="Chat already exists")
 
-        # Create new chat
+        # Create new chat. The ID is generated here, so the chat does not have to be refreshed after the commit.
+        chat_id = generate_uuid()
         chat = Chat(
+            id=chat_id,
             student_id=chat_data.student_id,
-            tutor_id=chat_data.tutor_id,
-            created_at=chat_data.created_at,
-            updated_at=chat_data.updated_at
+            tutor_id=chat_data.tutor_id
+            # created_at and updated_at are set on insert from a single clock read, see insert_timestamp
         )
         
         db.add(chat)
         db.commit()
-        db.refresh(chat)
+        if USE_REDIS:
+            # Both participants have a new chat in their list
+            redis_client.delete_cache(f"chats_{chat_data.student_id}", f"chats_{chat_data.tutor_id}")
 
-        return get_chat_with_messages(db, chat.id)  # Return chat with messages loaded
+        return ORJSONResponse(chat_to_dict(get_chat_with_messages(db, chat_id)))  # Return chat with messages loaded
 
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error creating chat: {str(e)}")
+        logger.error("Error creating chat: %s", e)
         db.rollback() 
         raise HTTPException(status_code=500, detail="Error creating chat")
 
@@ -172,8 +162,7 @@ def send_message(
         message = Message(
             chat_id=chatID,
             sender_id=sender.id,
-            content=content,
-            timestamp=datetime.now()
+            content=content
         )
         db.add(message)
         db.commit()
@@ -181,12 +170,11 @@ def send_message(
         
         # Invalidate cache after sending a message
         if USE_REDIS:
-            redis_client.delete_cache(f"chat_{chatID}")
-            redis_client.delete_cache(f"chats_{current_user.sub}")
+            redis_client.delete_cache(f"chat_{chatID}", f"chats_{current_user.sub}")
         # Optionally, delete cache for the other user involved in the chat
         
         return message
     except Exception as e:
-        logger.error(f"Error sending message in chat {chatID}: {str(e)}")
+        logger.error("Error sending message in chat %s: %s", chatID, e)
         db.rollback()
         raise HTTPException(status_code=500, detail="An error occurred while sending message")
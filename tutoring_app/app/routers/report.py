@@ -3,9 +3,10 @@ Report router handling user and message reporting functionality.
 Allows users to report inappropriate content or users for admin review.
 """
 from fastapi import APIRouter, Depends, HTTPException, Request
+from sqlalchemy import exists, insert
 from sqlalchemy.orm import Session
 from typing import List, Union
-from database.database import get_db, UserReport, MessageReport, User, Message
+from database.database import get_db, generate_uuid, UserReport, MessageReport, User, Message
 from auth_tools import get_current_user
 from schemas.authentication_schema import DecodedAccessToken
 from schemas.report_schema import ReportMessage, ReportUser
@@ -28,20 +29,21 @@ def report_message(request: Request, report: ReportMessage, current_user: Decode
     Returns:
         dict: A dictionary containing the report details and the ID of the created message report.
     """
-    message = db.query(Message).filter(Message.id == report.message_id).first()
-    if not message:
+    # Only check that the message exists, without loading it
+    if not db.query(exists().where(Message.id == report.message_id)).scalar():
         raise HTTPException(status_code=404, detail="Message not found")
 
-    message_report = MessageReport(
+    # A plain INSERT without the unit of work or loading the report back.
+    # The ID is generated here, so it does not have to be read back from the database.
+    report_id = generate_uuid()
+    db.execute(insert(MessageReport).values(
+        id=report_id,
         message_id=report.message_id,
         reason=report.reason,
         by=current_user.sub
-    )
-
-    db.add(message_report)
+    ))
     db.commit()
-    db.refresh(message_report)
-    return {**report.model_dump(), "id": message_report.id, "message": f"Message {report.message_id} reported"}
+    return {**report.model_dump(), "id": report_id, "message": f"Message {report.message_id} reported"}
 
 @router.post('/user/{userID}')
 def report_user(request: Request, report: ReportUser, current_user: DecodedAccessToken = Depends(get_current_user), db: Session = Depends(get_db)):
@@ -57,19 +59,17 @@ def report_user(request: Request, report: ReportUser, current_user: DecodedAcces
     Returns:
         dict: A dictionary containing the report details, report ID, and a message indicating the user has been reported.
     """
-    user = db.query(User).filter(User.id == report.user_id).first()
-
-    if not user:
+    # Only check that the user exists, without loading it
+    if not db.query(exists().where(User.id == report.user_id)).scalar():
         raise HTTPException(status_code=404, detail="User not found")
     
-    # Create a report for the user
-    user_report = UserReport(
+    # Create a report for the user, as a plain INSERT like report_message
+    report_id = generate_uuid()
+    db.execute(insert(UserReport).values(
+        id=report_id,
         user_id=report.user_id,
         reason=report.reason,
         by=current_user.sub
-    )
-
-    db.add(user_report)
+    ))
     db.commit()
-    db.refresh(user_report)
-    return {**report.model_dump(), "id": user_report.id, "message": f"User {report.user_id} reported"}
\ No newline at end of file
+    return {**report.model_dump(), "id": report_id, "message": f"User {report.user_id} reported"}
\ No newline at end of file
@@ -41,10 +41,10 @@ def contact_support(
     """Send a support message with rate limiting"""
     try:
         # Log support request
-        logger.info(f"Support request from user {current_user.sub}: {message}")
+        logger.info("Support request from user %s: %s", current_user.sub, message)
 
         # Here you would typically save to database or send email
         return {"message": "Support request received"}
     except Exception as e:
-        logger.error(f"Error processing support request: {str(e)}")
+        logger.error("Error processing support request: %s", e)
         raise HTTPException(status_code=500, detail="Error processing support request")
\ No newline at end of file
@@ -3,15 +3,18 @@ User router handling user profile management.
 Includes endpoints for updating profiles and managing user-specific data.
 """
 from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import ORJSONResponse, Response
+from sqlalchemy import select, update, func
 from sqlalchemy.orm import Session
 from typing import List, Union
-from database.database import get_db, User, UserRole, Appointment
+from database.database import get_db, User, UserRole, Appointment, TutorProfile, is_valid_uuid
 from auth_tools import get_current_user, require_roles
 from schemas.user_schema import ProfileUpdate, StudentProfileReponse, TutorProfileResponse, UserResponse
 from schemas.authentication_schema import DecodedAccessToken
 from schemas.appointment_schema import AppointmentResponse
 from database.redis import redis_client
-import json
+from utilities import user_to_dict, appointment_to_dict
+import orjson
 #hi
 from config import get_settings
 
@@ -36,7 +39,7 @@ def update_profile(request: Request, profile : ProfileUpdate, db: Session = Depe
     - HTTPException(403): If user not authorized
     """
     # Get the user from the database
-    user : User = db.query(User).filter(User.id == current_user.sub).first()
+    user : User = db.get(User, current_user.sub)
 
     # Check if user exists
     if not user:
@@ -54,50 +57,67 @@ def update_profile(request: Request, profile : ProfileUpdate, db: Session = Depe
     db.commit()
     return response
 
-@router.get('/profile', response_model=UserResponse)
+@router.get('/profile', response_model=None, responses={200: {"model": UserResponse}})
 def get_profile(
     request: Request,
     current_user: DecodedAccessToken = Depends(get_current_user),
     db: Session = Depends(get_db)
-):
+) -> Response:
+    # The profile is cached as the serialized response, a cache hit is returned without decoding it
+    cache_key = f"profile_{current_user.sub}"
     if USE_REDIS:
-        cache_key = f"profile_{current_user.sub}"
         cached_data = redis_client.get_cache(cache_key)
-    if (cached_data):
-        print('returning cached data (user)')
-        return json.loads(cached_data)
+        if cached_data:
+            return Response(content=cached_data, media_type="application/json")
 
-    user = db.query(User).filter(User.id == current_user.sub).first()
+    user = db.get(User, current_user.sub)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
 
+    data = orjson.dumps(user_to_dict(user))
     if USE_REDIS:
-        redis_client.set_cache(cache_key, json.dumps(user), expiration=300)  # Cache for 5 minutes
+        redis_client.set_cache(cache_key, data, expiration=300)  # Cache for 5 minutes
 
-    return user
+    return Response(content=data, media_type="application/json")
 
-@router.get('/{user_id}/appointments', response_model=List[AppointmentResponse])
-def get_appointments(request: Request, user_id: str, current_user: DecodedAccessToken = Depends(get_current_user), db: Session = Depends(get_db)):  # Changed from int
+@router.get('/{user_id}/appointments', response_model=None, responses={200: {"model": List[AppointmentResponse]}})
+def get_appointments(request: Request, user_id: str, current_user: DecodedAccessToken = Depends(get_current_user), db: Session = Depends(get_db)) -> ORJSONResponse:  # Changed from int
     """Get a list of appointments for a user. Admins can view all appointments, while students and tutors can only view their own appointments."""
     if current_user.role != UserRole.ADMIN.value and current_user.sub != user_id:
         raise HTTPException(status_code=403, detail="User not authorized to view appointments")
 
-    user = User.get_by_id(db, user_id)  # Use get_by_id method
+    # Only the role is needed to pick the appointments column
+    role = db.query(User.role).filter(User.id == user_id).scalar() if is_valid_uuid(user_id) else None
 
-    if not user:
+    if not role:
         raise HTTPException(status_code=404, detail="User not found")
 
-    if user.role == UserRole.STUDENT:
-        appointments = db.query(Appointment).filter(Appointment.student_id == user_id).all()
-    elif user.role == UserRole.TUTOR:
-        appointments = db.query(Appointment).filter(Appointment.tutor_id == user_id).all()
-    return appointments
+    # Both filters are served by the (student_id, date) and (tutor_id, date) indexes, already in date order
+    if role == UserRole.STUDENT:
+        query = db.query(Appointment).filter(Appointment.student_id == user_id)
+    elif role == UserRole.TUTOR:
+        query = db.query(Appointment).filter(Appointment.tutor_id == user_id)
+    else:
+        return ORJSONResponse([])  # Admins have no appointments
+    return ORJSONResponse([appointment_to_dict(appointment) for appointment in query.order_by(Appointment.date)])
 
 @router.post('/rate', response_model=dict)
 def submit_rating(request: Request, user_id: str, rating: float, review: str, current_user: DecodedAccessToken = Depends(get_current_user), db: Session = Depends(get_db)):  # Changed from int to str
-    user = User.get_by_id(db, user_id)  # Using new get_by_id method
-    if not user or user.role != UserRole.TUTOR:
+    if not is_valid_uuid(user_id):
+        raise HTTPException(status_code=404, detail="Tutor not found")
+
+    # Update the average in a single UPDATE instead of reading and writing it back,
+    # concurrent ratings cannot overwrite each other. A tutor without ratings has no average yet.
+    result = db.execute(
+        update(TutorProfile)
+        .where(TutorProfile.user_id.in_(select(User.id).where(User.id == user_id, User.role == UserRole.TUTOR)))
+        .values(
+            rating=(func.coalesce(TutorProfile.rating, 0) * TutorProfile.total_reviews + rating) / (TutorProfile.total_reviews + 1),
+            total_reviews=TutorProfile.total_reviews + 1
+        )
+    )
+    if result.rowcount == 0:
         raise HTTPException(status_code=404, detail="Tutor not found")
 
-    user.tutor_profile.rating = (user.tutor_profile.rating * user.tutor_profile.total_reviews + rating) / (user.tutor_profile.total_reviews + 1)
-    user.tutor_profile.total_reviews += 1
     db.commit()
     return {"message": "Rating submitted"}
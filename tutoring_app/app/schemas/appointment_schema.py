@@ -1,4 +1,4 @@
-from pydantic import BaseModel, field_validator
+from pydantic import BaseModel, ConfigDict, field_validator
 from typing import Optional
 from datetime import datetime
 from bleach import clean
@@ -30,12 +30,11 @@ class AppointmentResponse(AppointmentBase):
     student_id: str  # Changed from int to str for UUID 
     tutor_id: str    # Changed from int to str for UUID
     created_by: str  # Changed from int to str for UUID
-    created_at: datetime
-    updated_at: datetime
+    created_at: Optional[datetime] = None  # Not stored for appointments
+    updated_at: Optional[datetime] = None  # Not stored for appointments
     status: str
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 class RatingBase(BaseModel):
     """Base rating data"""
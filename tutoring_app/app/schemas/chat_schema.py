@@ -1,7 +1,10 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, Field
 from schemas.user_schema import UserResponse
 from datetime import datetime
-from typing import List
+from typing import List, Optional
+
+# Upper bound on the IDs of a bulk request, keeps the IN list of a single UPDATE small
+MAX_BULK_IDS = 1000
 
 class MessageResponse(BaseModel):
     """Message response data"""
@@ -12,8 +15,7 @@ class MessageResponse(BaseModel):
     timestamp: datetime
     is_deleted: bool
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 class ChatResponse(BaseModel):
     """Chat response data. A chat is a conversation between a student and tutor and is like a container for messages."""
@@ -24,19 +26,17 @@ class ChatResponse(BaseModel):
     updated_at: datetime
     messages: List[MessageResponse] = []
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 class ChatCreate(BaseModel):
     """Schema for creating a new chat between a student and tutor"""
     student_id: str
     tutor_id: str
     messages: List[MessageResponse] = []  # Optional list of messages
-    created_at: datetime = datetime.now()
-    updated_at: datetime = datetime.now()
+    created_at: Optional[datetime] = None  # Ignored, set when the chat is stored
+    updated_at: Optional[datetime] = None  # Ignored, set when the chat is stored
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 class MessageDeletedReponse(BaseModel):
     """Chat deleted response data"""
@@ -54,4 +54,26 @@ class BanUserReponse(BaseModel):
     user_id: str  # Changed from int
     banned_until: datetime
     issued_by: str  # Changed from int
-    message: str
\ No newline at end of file
+    message: str
+
+class BulkDeleteMessages(BaseModel):
+    """Messages to delete in a single request"""
+    message_ids: List[str] = Field(..., min_length=1, max_length=MAX_BULK_IDS)
+
+class BulkMessagesDeletedResponse(BaseModel):
+    """Bulk message deletion response data"""
+    chat_id: str
+    deleted_count: int
+    message: str
+
+class BulkBanUsers(BaseModel):
+    """Users to ban in a single request"""
+    user_ids: List[str] = Field(..., min_length=1, max_length=MAX_BULK_IDS)
+    ban_until: datetime
+
+class BulkBanUsersResponse(BaseModel):
+    """Bulk ban response data"""
+    banned_count: int
+    banned_until: datetime
+    issued_by: str
+    message: str
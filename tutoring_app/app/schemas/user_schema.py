@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr, StringConstraints, field_validator
+from pydantic import BaseModel, ConfigDict, EmailStr, StringConstraints, field_validator
 from typing import Annotated, Optional, List
 from database.database import UserRole
 from bleach import clean
@@ -22,13 +22,17 @@ class UserCreate(UserBase):
     """User creation data"""
     role: UserRole
 
+class UserCreatedResponse(BaseModel):
+    """User created response data"""
+    message: str
+    user_id: str
+
 class UserResponse(UserBase):
     """User response data"""
     id: str  # Changed from int to str for UUID
     role: UserRole
     created_at: datetime
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 ############################
 ##### SUBJECT SCHEMAs ######
@@ -45,8 +49,7 @@ class SubjectBase(BaseModel):
 class SubjectResponse(SubjectBase):
     """Subject response data"""
     id: str  # Changed from int to str for UUID
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 ############################
 ##### PROFILE SCHEMAS ######
@@ -65,8 +68,7 @@ class ProfileBase(BaseModel):
 class ProfileResponse(ProfileBase):
     """Profile response data"""
     id: str  # Changed from int to str for UUID
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 class ProfileCreate(ProfileBase):
     """Profile creation data"""
@@ -87,8 +89,7 @@ class TutorProfileCreate(ProfileBase):
             raise ValueError('Hourly rate cannot be negative')
         return v
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 class TutorProfileResponse(ProfileResponse):
     """Tutor profile response"""
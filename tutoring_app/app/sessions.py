@@ -0,0 +1,164 @@
+"""
+Session middlewares replacing starlette's SessionMiddleware.
+
+- RedisSessionMiddleware keeps the session data server-side in Redis, only an
+  opaque, random session ID is sent to the client in the session cookie.
+- EncryptedSessionMiddleware stores the session data in the cookie itself,
+  encrypted and authenticated with ChaCha20-Poly1305.
+
+Handlers keep using `request.session` as before (e.g. authlib stores the OAuth
+state there during the GitLab login flow). Sessions are serialized with orjson.
+"""
+import abc
+import base64
+import orjson
+import os
+import secrets
+import time
+import typing
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import ChaCha20Poly1305
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from starlette.datastructures import MutableHeaders
+from starlette.requests import HTTPConnection
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from database.redis import redis_client
+
+class BaseSessionMiddleware(abc.ABC):
+    """
+    Common cookie handling for the session middlewares.
+
+    Subclasses decide where the serialized session lives by implementing the abstract
+    `load_session`, `save_session` and `delete_session`, a subclass missing one of them
+    can not be instantiated. The session is only saved when it has been modified during the request.
+
+    Args:
+        app (ASGIApp): The wrapped application
+        session_cookie (str): Name of the session cookie
+        max_age (int): Lifetime of the session in seconds
+        path (str): Cookie path
+        same_site (str): Cookie SameSite policy
+        https_only (bool): Only send the cookie over HTTPS
+    """
+    def __init__(
+        self,
+        app: ASGIApp,
+        session_cookie: str = "session",
+        max_age: int = 14 * 24 * 60 * 60,  # 14 days, in seconds
+        path: str = "/",
+        same_site: typing.Literal["lax", "strict", "none"] = "lax",
+        https_only: bool = False,
+    ) -> None:
+        self.app = app
+        self.session_cookie = session_cookie
+        self.max_age = max_age
+        self.path = path
+        self.security_flags = "httponly; samesite=" + same_site
+        if https_only:  # Secure flag can be used with HTTPS only
+            self.security_flags += "; secure"
+
+    @abc.abstractmethod
+    async def load_session(self, cookie: str) -> typing.Optional[bytes]:
+        """Return the serialized session for the cookie value, or None if it is unknown or expired"""
+
+    @abc.abstractmethod
+    async def save_session(self, cookie: typing.Optional[str], data: bytes) -> str:
+        """Persist the serialized session and return the new cookie value"""
+
+    @abc.abstractmethod
+    async def delete_session(self, cookie: str):
+        """Remove a session that has been cleared"""
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        connection = HTTPConnection(scope)
+        cookie = connection.cookies.get(self.session_cookie)
+        initial_data = await self.load_session(cookie) if cookie else None
+        scope["session"] = orjson.loads(initial_data) if initial_data else {}
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                if scope["session"]:
+                    data = orjson.dumps(scope["session"])
+                    # Only persist the session if it changed during the request
+                    if data != initial_data:
+                        value = await self.save_session(cookie if initial_data else None, data)
+                        headers = MutableHeaders(scope=message)
+                        headers.append("Set-Cookie", f"{self.session_cookie}={value}; path={self.path}; "
+                                                     f"Max-Age={self.max_age}; {self.security_flags}")
+                elif initial_data:
+                    # The session has been cleared
+                    await self.delete_session(cookie)
+                    headers = MutableHeaders(scope=message)
+                    headers.append("Set-Cookie", f"{self.session_cookie}=null; path={self.path}; "
+                                                 f"expires=Thu, 01 Jan 1970 00:00:00 GMT; {self.security_flags}")
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+class RedisSessionMiddleware(BaseSessionMiddleware):
+    """
+    Session middleware keeping the session data in Redis.
+    The cookie only holds the session ID and the Redis key expires together with the cookie.
+    Uses the async client of the shared Redis module, so the connection limits apply to sessions too.
+
+    Args:
+        key_prefix (str): Prefix for the Redis keys holding the session data
+        (other arguments, see BaseSessionMiddleware)
+    """
+    def __init__(self, app: ASGIApp, key_prefix: str = "session:", **kwargs) -> None:
+        super().__init__(app, **kwargs)
+        self.key_prefix = key_prefix
+        self.client = redis_client.async_client
+
+    async def load_session(self, cookie: str) -> typing.Optional[bytes]:
+        return await self.client.get(self.key_prefix + cookie)
+
+    async def save_session(self, cookie: typing.Optional[str], data: bytes) -> str:
+        session_id = cookie or secrets.token_urlsafe(32)
+        await self.client.setex(self.key_prefix + session_id, self.max_age, data)
+        return session_id
+
+    async def delete_session(self, cookie: str):
+        await self.client.delete(self.key_prefix + cookie)
+
+class EncryptedSessionMiddleware(BaseSessionMiddleware):
+    """
+    Session middleware storing the session data in the cookie, encrypted with ChaCha20-Poly1305.
+
+    Cookie layout (base64): issue timestamp (8 bytes) | nonce (12 bytes) | ciphertext.
+    The timestamp is authenticated as associated data, sessions older than max_age are rejected.
+
+    Args:
+        secret_key (str): Secret the encryption key is derived from
+        (other arguments, see BaseSessionMiddleware)
+    """
+    def __init__(self, app: ASGIApp, secret_key: str, **kwargs) -> None:
+        super().__init__(app, **kwargs)
+        # Derive a 256 bit key from the secret once
+        key = HKDF(algorithm=hashes.SHA256(), length=32, salt=None, info=b"session-cookie").derive(secret_key.encode())
+        self.cipher = ChaCha20Poly1305(key)
+
+    async def load_session(self, cookie: str) -> typing.Optional[bytes]:
+        try:
+            raw = base64.urlsafe_b64decode(cookie)
+            issued_at = int.from_bytes(raw[:8], "big")
+            if time.time() - issued_at > self.max_age:
+                return None
+            return self.cipher.decrypt(raw[8:20], raw[20:], raw[:8])
+        except (ValueError, InvalidTag):
+            # Tampered, malformed or encrypted with another key
+            return None
+
+    async def save_session(self, cookie: typing.Optional[str], data: bytes) -> str:
+        issued_at = int(time.time()).to_bytes(8, "big")
+        nonce = os.urandom(12)
+        raw = issued_at + nonce + self.cipher.encrypt(nonce, data, issued_at)
+        return base64.urlsafe_b64encode(raw).decode()
+
+    async def delete_session(self, cookie: str):
+        pass # Nothing stored server-side
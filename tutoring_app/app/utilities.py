@@ -1,51 +1,138 @@
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.orm import Session, joinedload, selectinload
 from fastapi import HTTPException
 from typing import Optional
-from database.database   import User, Chat, Message, UserRole
+from database.database   import User, Chat, Message, Appointment, UserRole
 from logger import logger
+from bleach import clean
 
 def get_user_by_id(db: Session, user_id: int) -> Optional[User]:
     """Get user by ID with error handling"""
     try:
-        user = db.query(User).filter(User.id == user_id).first()
+        # Session.get returns the user from the identity map if it is already loaded, without a SELECT
+        user = db.get(User, user_id)
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         return user
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Error retrieving user {user_id}: {str(e)}")
+        logger.error("Error retrieving user %s: %s", user_id, e)
         raise HTTPException(status_code=500, detail="Error retrieving user data")
 
 def get_chat_with_messages(db: Session, chat_id: int) -> Optional[Chat]:
     """Get chat with all related data loaded"""
     try:
+        # The messages are loaded with a second SELECT ... IN query instead of a join,
+        # joining the collection would repeat the chat, student and tutor columns for every message
         chat = db.query(Chat).options(
             joinedload(Chat.student),
             joinedload(Chat.tutor),
-            joinedload(Chat.messages).joinedload(Message.sender)
+            selectinload(Chat.messages).joinedload(Message.sender)
         ).filter(Chat.id == chat_id).first()
 
         if not chat:
             raise HTTPException(status_code=404, detail="Chat not found")
             
         if not chat.student or not chat.tutor:
-            logger.error(f"Chat {chat_id} has invalid student or tutor reference")
+            logger.error("Chat %s has invalid student or tutor reference", chat_id)
             raise HTTPException(status_code=404, detail="Chat data is incomplete")
             
         return chat
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error retrieving chat {chat_id}: {str(e)}")
+        logger.error("Error retrieving chat %s: %s", chat_id, e)
         raise HTTPException(status_code=500, detail="Error retrieving chat data")
 
+def user_to_dict(user: User) -> dict:
+    """Convert a user to a plain dict with the fields of UserResponse"""
+    return {
+        "email": user.email,
+        "name": clean(user.name, strip=True),  # Same sanitization as the UserResponse validator
+        "id": user.id,
+        "role": user.role.value,
+        "created_at": user.created_at
+    }
+
+def chat_to_dict(chat: Chat, include_messages: bool = True) -> dict:
+    """
+    Convert a chat with its messages to a plain dict with the fields of ChatResponse.
+    Endpoints returning it with ORJSONResponse skip building and validating a
+    response model per message, which dominates for chats with many messages.
+    With include_messages=False the messages are not loaded and returned as an empty list.
+    """
+    # A chat only has a few distinct senders, convert each user once
+    users = {}
+    def convert_user(user: User) -> dict:
+        if user.id not in users:
+            users[user.id] = user_to_dict(user)
+        return users[user.id]
+
+    return {
+        "id": chat.id,
+        "student": convert_user(chat.student),
+        "tutor": convert_user(chat.tutor),
+        "created_at": chat.created_at,
+        "updated_at": chat.updated_at,
+        "messages": [
+            {
+                "id": message.id,
+                "chat_id": message.chat_id,
+                "sender": convert_user(message.sender),
+                "content": message.content,
+                "timestamp": message.timestamp,
+                "is_deleted": message.is_deleted
+            }
+            for message in chat.messages
+        ] if include_messages else []
+    }
+
+def report_to_dict(message: Message) -> dict:
+    """Convert a deleted (reported) message and its sender to a plain dict, as listed by the admin reports endpoint"""
+    sender = message.sender
+    return {
+        "id": message.id,
+        "chat_id": message.chat_id,
+        "sender_id": message.sender_id,
+        "content": message.content,
+        "timestamp": message.timestamp,
+        "is_deleted": message.is_deleted,
+        "sender": {
+            "id": sender.id,
+            "role": sender.role.value,
+            "email": sender.email,
+            "name": sender.name,
+            "created_at": sender.created_at,
+            "updated_at": sender.updated_at,
+            "is_banned_until": sender.is_banned_until
+        }
+    }
+
+def appointment_to_dict(appointment: Appointment) -> dict:
+    """Convert an appointment to a plain dict with the fields of AppointmentResponse"""
+    return {
+        "topic": clean(appointment.topic),  # Same sanitization as the AppointmentResponse validator
+        "date": appointment.date,
+        "duration": appointment.duration,
+        "id": appointment.id,
+        "student_id": appointment.student_id,
+        "tutor_id": appointment.tutor_id,
+        "created_by": appointment.created_by,
+        "created_at": None,  # Not stored for appointments
+        "updated_at": None,
+        "status": appointment.status
+    }
+
 def get_user_chats(db: Session, user_id: int, role: UserRole) -> list:
     """Get all chats for a user based on their role"""
     try:
+        # The chats are returned with their student and tutor
+        query = db.query(Chat).options(joinedload(Chat.student), joinedload(Chat.tutor))
         if role == UserRole.STUDENT:
-            return db.query(Chat).filter(Chat.student_id == user_id).all()
+            return query.filter(Chat.student_id == user_id).all()
         elif role == UserRole.TUTOR:
-            return db.query(Chat).filter(Chat.tutor_id == user_id).all()
+            return query.filter(Chat.tutor_id == user_id).all()
         return []
     except Exception as e:
-        logger.error(f"Error retrieving chats for user {user_id}: {str(e)}")
+        logger.error("Error retrieving chats for user %s: %s", user_id, e)
         raise HTTPException(status_code=500, detail="Error retrieving chat data")
\ No newline at end of file
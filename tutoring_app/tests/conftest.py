@@ -0,0 +1,17 @@
+"""
+Shared test setup.
+The app modules use flat imports and read their settings once, when they are imported.
+The app directory is put on the path and the settings point to a temporary directory
+before any test module imports the app.
+"""
+import os
+import sys
+import tempfile
+
+APP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app")
+TEST_DIR = tempfile.mkdtemp(prefix="tutoring_app_tests_")
+
+os.environ["DB_URL"] = f"sqlite:///{os.path.join(TEST_DIR, 'test.db')}"
+os.environ["LOGS_DIR"] = os.path.join(TEST_DIR, "logs")
+os.environ["USE_REDIS"] = "false"
+sys.path.insert(0, APP_DIR)
@@ -0,0 +1,172 @@
+import fakeredis
+import pytest
+from fastapi.testclient import TestClient
+from main import app
+from database.database import SessionLocal, User, Chat, Message, UserRole, generate_uuid
+from routers.authentication import create_access_token
+import routers.admin
+from routers.admin import REPORTS_PAGE_SIZE
+from database.redis import redis_client
+from schemas.chat_schema import MAX_BULK_IDS
+
+client = TestClient(app)
+
+def make_user(db, role: UserRole) -> User:
+    user_id = generate_uuid()
+    user = User(id=user_id, name=role.value.title(), email=f"{user_id}@example.com", role=role)
+    db.add(user)
+    return user
+
+@pytest.fixture
+def admin_headers():
+    db = SessionLocal()
+    admin = make_user(db, UserRole.ADMIN)
+    db.commit()
+    token = create_access_token(admin.id, admin.name, admin.email, UserRole.ADMIN.value, "")
+    db.close()
+    return {"Authorization": f"Bearer {token}"}
+
+@pytest.fixture
+def chat():
+    """A chat with three messages, the last one already deleted"""
+    db = SessionLocal()
+    student = make_user(db, UserRole.STUDENT)
+    tutor = make_user(db, UserRole.TUTOR)
+    chat = Chat(id=generate_uuid(), student_id=student.id, tutor_id=tutor.id)
+    db.add(chat)
+    messages = [
+        Message(id=generate_uuid(), chat_id=chat.id, sender_id=student.id, content="one"),
+        Message(id=generate_uuid(), chat_id=chat.id, sender_id=tutor.id, content="two"),
+        Message(id=generate_uuid(), chat_id=chat.id, sender_id=student.id, content="three", is_deleted=True)
+    ]
+    db.add_all(messages)
+    db.commit()
+    data = {"id": chat.id, "student_id": student.id, "tutor_id": tutor.id, "message_ids": [m.id for m in messages]}
+    db.close()
+    return data
+
+def deleted_flags(message_ids):
+    db = SessionLocal()
+    try:
+        return {m.id: m.is_deleted for m in db.query(Message).filter(Message.id.in_(message_ids))}
+    finally:
+        db.close()
+
+def banned_until(user_ids):
+    db = SessionLocal()
+    try:
+        return {u.id: u.is_banned_until for u in db.query(User).filter(User.id.in_(user_ids))}
+    finally:
+        db.close()
+
+def test_bulk_delete_mixed_ids(admin_headers, chat):
+    first, second, _ = chat["message_ids"]
+    response = client.post(f"/admin/chats/{chat['id']}/messages/bulk_delete", headers=admin_headers,
+                           json={"message_ids": [first, second, generate_uuid()]})
+    assert response.status_code == 200
+    assert response.json()["deleted_count"] == 2
+    assert deleted_flags([first, second]) == {first: True, second: True}
+
+def test_bulk_delete_does_not_count_deleted_messages(admin_headers, chat):
+    first, _, already_deleted = chat["message_ids"]
+    response = client.post(f"/admin/chats/{chat['id']}/messages/bulk_delete", headers=admin_headers,
+                           json={"message_ids": [first, already_deleted]})
+    assert response.status_code == 200
+    assert response.json()["deleted_count"] == 1
+
+def test_bulk_delete_ignores_messages_of_other_chats(admin_headers, chat):
+    db = SessionLocal()
+    other = Chat(id=generate_uuid(), student_id=chat["student_id"], tutor_id=chat["tutor_id"])
+    db.add(other)
+    db.commit()
+    other_id = other.id
+    db.close()
+
+    response = client.post(f"/admin/chats/{other_id}/messages/bulk_delete", headers=admin_headers,
+                           json={"message_ids": chat["message_ids"][:2]})
+    assert response.status_code == 200
+    assert response.json()["deleted_count"] == 0
+    assert not any(deleted_flags(chat["message_ids"][:2]).values())
+
+def test_bulk_delete_empty_list(admin_headers, chat):
+    response = client.post(f"/admin/chats/{chat['id']}/messages/bulk_delete", headers=admin_headers,
+                           json={"message_ids": []})
+    assert response.status_code == 422
+
+def test_bulk_delete_too_many_ids(admin_headers, chat):
+    response = client.post(f"/admin/chats/{chat['id']}/messages/bulk_delete", headers=admin_headers,
+                           json={"message_ids": [generate_uuid() for _ in range(MAX_BULK_IDS + 1)]})
+    assert response.status_code == 422
+
+def test_bulk_delete_unknown_chat(admin_headers):
+    response = client.post(f"/admin/chats/{generate_uuid()}/messages/bulk_delete", headers=admin_headers,
+                           json={"message_ids": [generate_uuid()]})
+    assert response.status_code == 404
+
+def test_bulk_ban_mixed_ids(admin_headers, chat):
+    response = client.post("/admin/users/bulk_ban", headers=admin_headers, json={
+        "user_ids": [chat["student_id"], chat["tutor_id"], generate_uuid()],
+        "ban_until": "2030-01-01T00:00:00"
+    })
+    assert response.status_code == 200
+    assert response.json()["banned_count"] == 2
+    assert all(until is not None and until.year == 2030
+               for until in banned_until([chat["student_id"], chat["tutor_id"]]).values())
+
+def test_bulk_ban_empty_list(admin_headers):
+    response = client.post("/admin/users/bulk_ban", headers=admin_headers,
+                           json={"user_ids": [], "ban_until": "2030-01-01T00:00:00"})
+    assert response.status_code == 422
+
+def test_bulk_ban_too_many_ids(admin_headers):
+    response = client.post("/admin/users/bulk_ban", headers=admin_headers, json={
+        "user_ids": [generate_uuid() for _ in range(MAX_BULK_IDS + 1)],
+        "ban_until": "2030-01-01T00:00:00"
+    })
+    assert response.status_code == 422
+
+def test_bulk_ban_unknown_users(admin_headers):
+    response = client.post("/admin/users/bulk_ban", headers=admin_headers,
+                           json={"user_ids": [generate_uuid()], "ban_until": "2030-01-01T00:00:00"})
+    assert response.status_code == 404
+
+def test_bulk_endpoints_require_admin(chat):
+    token = create_access_token(chat["student_id"], "Student", "s@example.com", UserRole.STUDENT.value, "")
+    headers = {"Authorization": f"Bearer {token}"}
+    assert client.post("/admin/users/bulk_ban", headers=headers,
+                       json={"user_ids": [chat["tutor_id"]], "ban_until": "2030-01-01T00:00:00"}).status_code == 403
+    assert client.post(f"/admin/chats/{chat['id']}/messages/bulk_delete", headers=headers,
+                       json={"message_ids": chat["message_ids"]}).status_code == 403
+
+def test_delete_user(admin_headers, chat):
+    response = client.delete(f"/admin/users/{chat['student_id']}/delete", headers=admin_headers)
+    assert response.status_code == 200
+    assert banned_until([chat["student_id"]]) == {}
+    assert deleted_flags(chat["message_ids"]) == {}
+
+def test_delete_user_drops_counterpart_chat_lists(admin_headers, chat, monkeypatch):
+    monkeypatch.setattr(routers.admin, "USE_REDIS", True)
+    monkeypatch.setattr(redis_client, "client", fakeredis.FakeRedis(decode_responses=True))
+    redis_client.set_cache(f"chats_{chat['tutor_id']}", "[]", expiration=60)
+    response = client.delete(f"/admin/users/{chat['student_id']}/delete", headers=admin_headers)
+    assert response.status_code == 200
+    assert redis_client.get_cache(f"chats_{chat['tutor_id']}") is None
+
+def test_delete_unknown_user(admin_headers):
+    response = client.delete(f"/admin/users/{generate_uuid()}/delete", headers=admin_headers)
+    assert response.status_code == 404
+    assert response.json()["detail"] == "User not found"
+
+def test_reports_default_page(admin_headers, chat):
+    db = SessionLocal()
+    db.add_all([
+        Message(id=generate_uuid(), chat_id=chat["id"], sender_id=chat["student_id"], content="report", is_deleted=True)
+        for _ in range(REPORTS_PAGE_SIZE + 1)
+    ])
+    db.commit()
+    db.close()
+    response = client.get("/admin/reports", headers=admin_headers)
+    assert response.status_code == 200
+    body = response.json()
+    assert len(body["reports"]) == REPORTS_PAGE_SIZE
+    assert body["next"] is not None
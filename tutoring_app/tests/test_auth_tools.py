@@ -0,0 +1,83 @@
+import time
+import pytest
+from datetime import datetime, timedelta
+from jose import ExpiredSignatureError, JWTError, jwt
+import auth_tools
+
+def make_token(sub: str = "user", expires_in: timedelta = timedelta(minutes=5)) -> str:
+    payload = {"sub": sub, "role": "STUDENT", "exp": datetime.utcnow() + expires_in}
+    return jwt.encode(payload, auth_tools.SECRET_KEY, algorithm=auth_tools.ALGORITHM)
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    auth_tools._decoded_tokens.clear()
+    yield
+    auth_tools._decoded_tokens.clear()
+
+@pytest.fixture
+def decode_calls(monkeypatch):
+    """Count the calls reaching jwt.decode"""
+    calls = []
+    decode = auth_tools.jwt.decode
+    def counting_decode(*args, **kwargs):
+        calls.append(args[0])
+        return decode(*args, **kwargs)
+    monkeypatch.setattr(auth_tools.jwt, "decode", counting_decode)
+    return calls
+
+def test_cache_hit_skips_verification(decode_calls):
+    token = make_token()
+    first = auth_tools.decode_token(token)
+    second = auth_tools.decode_token(token)
+    assert first == second
+    assert first["sub"] == "user"
+    assert len(decode_calls) == 1
+
+def test_cache_is_keyed_by_hash(decode_calls):
+    token = make_token()
+    auth_tools.decode_token(token)
+    assert token not in auth_tools._decoded_tokens
+    assert all(isinstance(key, bytes) and len(key) == 16 for key in auth_tools._decoded_tokens)
+
+def test_returned_payload_is_a_copy(decode_calls):
+    token = make_token()
+    payload = auth_tools.decode_token(token)
+    payload["role"] = "ADMIN"
+    assert auth_tools.decode_token(token)["role"] == "STUDENT"
+
+def test_expired_token_is_rejected_and_not_cached(decode_calls):
+    token = make_token(expires_in=timedelta(minutes=-1))
+    with pytest.raises(ExpiredSignatureError):
+        auth_tools.decode_token(token)
+    assert not auth_tools._decoded_tokens
+
+def test_cached_token_expires(monkeypatch, decode_calls):
+    token = make_token(expires_in=timedelta(minutes=5))
+    auth_tools.decode_token(token)
+    later = time.time() + 600
+    monkeypatch.setattr(auth_tools.time, "time", lambda: later)
+    # The cached payload is dropped and the token is verified again, at the same later time
+    def expired(*args, **kwargs):
+        raise ExpiredSignatureError("Signature has expired.")
+    monkeypatch.setattr(auth_tools.jwt, "decode", expired)
+    with pytest.raises(ExpiredSignatureError):
+        auth_tools.decode_token(token)
+    assert not auth_tools._decoded_tokens
+
+def test_invalid_token_is_not_cached():
+    with pytest.raises(JWTError):
+        auth_tools.decode_token(make_token() + "x")
+    assert not auth_tools._decoded_tokens
+
+def test_oldest_entry_is_evicted(monkeypatch, decode_calls):
+    monkeypatch.setattr(auth_tools, "DECODE_CACHE_SIZE", 2)
+    tokens = [make_token(sub=f"user{i}") for i in range(3)]
+    for token in tokens:
+        auth_tools.decode_token(token)
+    assert len(auth_tools._decoded_tokens) == 2
+
+    # The newest tokens are still cached, the oldest is verified again
+    auth_tools.decode_token(tokens[2])
+    assert len(decode_calls) == 3
+    auth_tools.decode_token(tokens[0])
+    assert len(decode_calls) == 4
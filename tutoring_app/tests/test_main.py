@@ -0,0 +1,53 @@
+import gzip
+import orjson
+import pytest
+from fastapi.testclient import TestClient
+from main import app, accepts_gzip, MOCK_RESPONSES, MOCK_RESPONSES_GZIP
+
+client = TestClient(app)
+
+@pytest.mark.parametrize("header, expected", [
+    ("gzip", True),
+    ("GZIP", True),
+    ("x-gzip", True),
+    ("br, gzip;q=0.5", True),
+    ("*", True),
+    ("*;q=0, gzip", True),
+    ("", False),
+    ("identity", False),
+    ("gzip;q=0", False),
+    ("gzip;q=0.0, br", False),
+    ("gzip;q=0, *", False),
+    ("*;q=0", False),
+    ("gzip;q=abc", False),
+    ("x-gzip-not", False),
+    ("notgzip", False),
+])
+def test_accepts_gzip(header, expected):
+    assert accepts_gzip(header) is expected
+
+def test_mock_response_is_gzipped_when_accepted():
+    response = client.get("/mock/users", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["Vary"] == "Accept-Encoding"
+    assert response.json() == orjson.loads(MOCK_RESPONSES["users"])
+
+@pytest.mark.parametrize("header", ["identity", "gzip;q=0", "x-gzip-not"])
+def test_mock_response_is_plain_when_gzip_is_refused(header):
+    response = client.get("/mock/users", headers={"Accept-Encoding": header})
+    assert response.status_code == 200
+    assert "Content-Encoding" not in response.headers
+    assert response.headers["Vary"] == "Accept-Encoding"
+    assert response.content == MOCK_RESPONSES["users"]
+
+def test_mock_response_without_gzip_variant():
+    response = client.get("/mock/messages", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert "Content-Encoding" not in response.headers
+    assert "Vary" not in response.headers
+    assert response.content == MOCK_RESPONSES["messages"]
+
+def test_gzip_variants_match_plain_bodies():
+    for name, body in MOCK_RESPONSES_GZIP.items():
+        assert gzip.decompress(body) == MOCK_RESPONSES[name]
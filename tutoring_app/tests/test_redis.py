@@ -0,0 +1,67 @@
+import fakeredis
+import pytest
+from database.redis import redis_client
+from routers.admin import iter_users
+
+@pytest.fixture
+def server(monkeypatch):
+    """Point the shared Redis client to an in-memory server"""
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(redis_client, "client", fakeredis.FakeRedis(server=server, decode_responses=True))
+    return server
+
+def test_set_cache_if_version_writes_when_unchanged(server):
+    version = redis_client.get_cache_version("entry")
+    assert redis_client.set_cache_if_version("entry", "value", expiration=60, version=version)
+    assert redis_client.get_cache("entry") == "value"
+
+def test_invalidate_cache_bumps_version_and_deletes(server):
+    redis_client.set_cache("entry", "value", expiration=60)
+    version = redis_client.get_cache_version("entry")
+    redis_client.invalidate_cache("entry")
+    assert redis_client.get_cache("entry") is None
+    assert redis_client.get_cache_version("entry") == version + 1
+
+def test_set_cache_if_version_rejects_after_invalidation(server):
+    version = redis_client.get_cache_version("entry")
+    redis_client.invalidate_cache("entry")
+    assert not redis_client.set_cache_if_version("entry", "stale", expiration=60, version=version)
+    assert redis_client.get_cache("entry") is None
+
+def test_set_cache_if_version_rejects_invalidation_between_check_and_write(server, monkeypatch):
+    # Another client invalidates right after the writer compared the version, the EXEC must fail
+    other = fakeredis.FakeRedis(server=server, decode_responses=True)
+    pipeline = redis_client.client.pipeline
+    def racing_pipeline(*args, **kwargs):
+        pipe = pipeline(*args, **kwargs)
+        get = pipe.get
+        def get_then_invalidate(name):
+            value = get(name)
+            other.incr("entry:version")
+            other.delete("entry")
+            return value
+        pipe.get = get_then_invalidate
+        return pipe
+    monkeypatch.setattr(redis_client.client, "pipeline", racing_pipeline)
+
+    version = redis_client.get_cache_version("entry")
+    assert not redis_client.set_cache_if_version("entry", "stale", expiration=60, version=version)
+    assert other.get("entry") is None
+
+def test_user_list_invalidated_during_stream_is_not_cached(server):
+    stream = iter_users(redis_client.get_cache_version("admin_users"))
+    next(stream)  # Streaming has started, the users are being read
+    redis_client.invalidate_cache("admin_users")  # A user is created or deleted meanwhile
+    body = b"".join(stream)
+    assert body.endswith(b"]")
+    assert redis_client.get_cache("admin_users") is None
+
+def test_complete_user_list_is_cached(server):
+    body = b"".join(iter_users(redis_client.get_cache_version("admin_users")))
+    assert redis_client.get_cache("admin_users") == body.decode()
+
+def test_disconnected_stream_is_not_cached(server):
+    stream = iter_users(redis_client.get_cache_version("admin_users"))
+    next(stream)
+    stream.close()  # The client disconnected
+    assert redis_client.get_cache("admin_users") is None